@@ -0,0 +1,35 @@
+"""
+Helpers for benchmark management commands.
+
+Benchmarks create users, products and orders at volume, so they never run
+in the configured database: benchmark_database() creates a throwaway copy
+of the schema the way the test runner does and drops it afterwards.
+"""
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Run the block against a freshly migrated database named bench_<NAME>.
+    Connections opened by other threads must be closed before the block ends.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = f'bench_{old_name}'
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(values, fraction):
+    """
+    Return the value at the given fraction (0.0 - 1.0) of the sorted values, 0 if empty.
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
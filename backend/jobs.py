@@ -0,0 +1,77 @@
+"""
+Shared pieces of the background workers.
+
+Queued work (outgoing emails, account deletions, data exports) lives in
+tables with status, attempts and next_attempt_at columns. Workers take due
+rows with claim_due() and run as management commands built on PollingCommand.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def claim_due(queryset, claim_timeout, limit=1):
+    """
+    Claim up to limit pending rows of queryset that are due, skipping rows locked by other workers.
+    Each claim counts an attempt and hides the row from other workers for claim_timeout,
+    so a row whose worker died is retried after that. Returns the claimed rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            queryset
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        if rows:
+            queryset.model.objects.filter(id__in=[row.id for row in rows]).update(
+                attempts=F('attempts') + 1, next_attempt_at=now + claim_timeout
+            )
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = now + claim_timeout
+    return rows
+
+
+class PollingCommand(BaseCommand):
+    """
+    Worker command processing queued work until nothing is due, or polling for more with --loop.
+    Subclasses implement process() and set summary, formatted with the number of items processed.
+    """
+    # Default of --batch-size; None for workers without batches
+    batch_size = None
+    # Default of --interval
+    interval = 5.0
+    summary = 'Processed {} items.'
+
+    def add_arguments(self, parser):
+        if self.batch_size is not None:
+            parser.add_argument('--batch-size', type=int, default=self.batch_size)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new work')
+        parser.add_argument('--interval', type=float, default=self.interval, help='Seconds to wait when nothing is due')
+
+    def process(self, options):
+        """
+        Process one batch of due work. Returns the number of items processed, 0 when nothing was due.
+        """
+        raise NotImplementedError
+
+    def get_summary(self, processed_total):
+        return self.summary.format(processed_total)
+
+    def handle(self, *args, **options):
+        processed_total = 0
+        while True:
+            processed = self.process(options)
+            processed_total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(self.get_summary(processed_total)))
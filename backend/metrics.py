@@ -0,0 +1,100 @@
+"""
+In-process metrics registry.
+
+Counters, gauges and histograms are kept per process and exposed
+in the Prometheus text format at /api/metrics/ (admin only).
+"""
+import math
+import threading
+
+
+DEFAULT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """
+    Increase a counter.
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """
+    Set a gauge to the given value.
+    """
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """
+    Record a value in a histogram (e.g. a duration in milliseconds).
+    """
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                'buckets': buckets,
+                'counts': [0] * len(buckets),
+                'count': 0,
+                'sum': 0,
+            }
+        for index, bound in enumerate(histogram['buckets']):
+            if value <= bound:
+                histogram['counts'][index] += 1
+        histogram['count'] += 1
+        histogram['sum'] += value
+
+
+def reset():
+    """
+    Remove all recorded metrics.
+    """
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{key}="{value}"' for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == math.inf else f'{bound:g}'
+
+
+def render_prometheus():
+    """
+    Render all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+        for (name, labels), value in sorted(_gauges.items()):
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(_histograms.items()):
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                bucket_labels = _format_labels(labels, [('le', _format_bound(bound))])
+                lines.append(f'{name}_bucket{bucket_labels} {count}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+    return '\n'.join(lines) + '\n'
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +49,7 @@ INSTALLED_APPS = [
     'orders',
     'payments',
     'cart',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -60,6 +64,8 @@ MIDDLEWARE = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'x-guest-cart-token', 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['X-Guest-Cart-Token', 'Idempotent-Replayed']
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -114,6 +120,33 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# Argon2id when argon2-cffi is installed, otherwise PBKDF2. Older hashes are verified
+# with the remaining hashers and upgraded to the first one on login
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2' if importlib.util.find_spec('argon2') else 'pbkdf2')
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 3))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 64 * 1024))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', 1_000_000))
+
+PASSWORD_HASHERS = [
+    'users.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if PASSWORD_HASHER == 'argon2':
+    PASSWORD_HASHERS.insert(0, 'users.hashers.TunedArgon2PasswordHasher')
+else:
+    PASSWORD_HASHERS.append('users.hashers.TunedArgon2PasswordHasher')
+
+AUTHENTICATION_BACKENDS = ['users.backends.OffloadedHashingBackend']
+
+# Hashing runs on this many threads; further requests wait in a queue of this depth or get 503
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 4))
+PASSWORD_HASHING_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASHING_QUEUE_DEPTH', 16))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -149,11 +182,25 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    # Token bucket rates for backend.throttling, keyed by <view throttle_scope>_<ip|email|guest>
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": os.getenv('THROTTLE_LOGIN_IP', '30/min'),
+        "login_email": os.getenv('THROTTLE_LOGIN_EMAIL', '10/min'),
+        "register_ip": os.getenv('THROTTLE_REGISTER_IP', '10/hour'),
+        "password_reset_ip": os.getenv('THROTTLE_PASSWORD_RESET_IP', '20/hour'),
+        "password_reset_email": os.getenv('THROTTLE_PASSWORD_RESET_EMAIL', '5/hour'),
+        "guest_cart_ip": os.getenv('THROTTLE_GUEST_CART_IP', '300/min'),
+        "guest_cart_guest": os.getenv('THROTTLE_GUEST_CART_GUEST', '60/min'),
+        "guest_checkout_ip": os.getenv('THROTTLE_GUEST_CHECKOUT_IP', '20/min'),
+        "guest_checkout_guest": os.getenv('THROTTLE_GUEST_CHECKOUT_GUEST', '5/min'),
+    },
+    # Number of reverse proxies in front of the app, used to read the client IP from X-Forwarded-For
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', 0)),
 }
 
 # Simple JWT settings
@@ -166,8 +213,24 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsTokenUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.ClaimsTokenObtainPairSerializer',
 }
 
+# Seconds the authenticated user row is cached (users.authentication.CachedJWTAuthentication), 0 disables
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 60))
+
+# Account deletions are processed by manage.py process_account_deletions
+ACCOUNT_DELETION_MAX_ATTEMPTS = int(os.getenv('ACCOUNT_DELETION_MAX_ATTEMPTS', 5))
+ACCOUNT_DELETION_RETRY_DELAY_SECONDS = int(os.getenv('ACCOUNT_DELETION_RETRY_DELAY_SECONDS', 300))
+
+# Personal data exports with more orders than this are built by manage.py process_data_exports
+USER_EXPORT_SYNC_MAX_ORDERS = int(os.getenv('USER_EXPORT_SYNC_MAX_ORDERS', 500))
+USER_EXPORT_MAX_ATTEMPTS = int(os.getenv('USER_EXPORT_MAX_ATTEMPTS', 3))
+USER_EXPORT_RETENTION = timedelta(days=int(os.getenv('USER_EXPORT_RETENTION_DAYS', 7)))
+# Export archives are private: kept outside MEDIA_ROOT and served only by DataExportDownloadView
+USER_EXPORT_ROOT = os.getenv('USER_EXPORT_ROOT', BASE_DIR / 'private' / 'exports')
+
 import dotenv
 dotenv.load_dotenv()
 
@@ -175,6 +238,25 @@ STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
+# Payment gateway: payments.gateways.StripeGateway or payments.gateways.FakeGateway (load tests, CI)
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'payments.gateways.StripeGateway')
+PAYMENT_FAKE_LATENCY_MS = int(os.getenv('PAYMENT_FAKE_LATENCY_MS', 0))
+PAYMENT_FAKE_FAILURE_RATE = float(os.getenv('PAYMENT_FAKE_FAILURE_RATE', 0))
+PAYMENT_FAKE_WEBHOOK_URL = os.getenv('PAYMENT_FAKE_WEBHOOK_URL', '')
+
+# Stripe HTTP client: pooled connections, timeouts in seconds, SDK retries with backoff and jitter
+STRIPE_HTTP_POOL_SIZE = int(os.getenv('STRIPE_HTTP_POOL_SIZE', 10))
+STRIPE_CONNECT_TIMEOUT = float(os.getenv('STRIPE_CONNECT_TIMEOUT', 3))
+STRIPE_READ_TIMEOUT = float(os.getenv('STRIPE_READ_TIMEOUT', 10))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', 2))
+# Circuit breaker: open after this many consecutive failures, try again after the recovery time
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('STRIPE_CIRCUIT_FAILURE_THRESHOLD', 5))
+STRIPE_CIRCUIT_RECOVERY_SECONDS = float(os.getenv('STRIPE_CIRCUIT_RECOVERY_SECONDS', 30))
+
+# Stripe webhook events are processed by manage.py process_webhook_events
+STRIPE_WEBHOOK_MAX_ATTEMPTS = int(os.getenv('STRIPE_WEBHOOK_MAX_ATTEMPTS', 5))
+STRIPE_WEBHOOK_RETRY_DELAY_SECONDS = int(os.getenv('STRIPE_WEBHOOK_RETRY_DELAY_SECONDS', 60))
+
 # Email configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -184,5 +266,66 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@ecommerce.com')
 
+# Email outbox (delivered by manage.py send_queued_emails)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS = int(os.getenv('EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS', 30))
+EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS = int(os.getenv('EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS', 60 * 60))
+
+# Logging configuration
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'format': 'time=%(asctime)s level=%(levelname)s logger=%(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        app: {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')}
+        for app in ('users', 'products', 'orders', 'payments', 'cart', 'notifications')
+    },
+}
+
+# Cache configuration
+# LocMemCache is per process - use a shared backend (e.g. RedisCache) in production
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Session configuration
+# Supported engines: db, cached_db, cache, signed_cookies
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'cached_db')
+if '.' not in SESSION_ENGINE:
+    SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_ENGINE}'
+
+# Guest cart configuration
+# Clients sending the X-Guest-Cart-Token header never create a session;
+# set GUEST_CART_USE_SESSION=False to track every guest cart by token only
+GUEST_CART_USE_SESSION = os.getenv('GUEST_CART_USE_SESSION', 'True') == 'True'
+GUEST_CART_TOKEN_MAX_AGE = int(os.getenv('GUEST_CART_TOKEN_MAX_AGE', 60 * 60 * 24 * 30))
+
+# Idempotency-Key responses are kept for this long (purge with manage.py purge_idempotency_keys)
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+# A request holding a key for longer is presumed dead and its retry takes over; keep above the worker timeout
+IDEMPOTENCY_KEY_LOCK_TIMEOUT = timedelta(seconds=int(os.getenv('IDEMPOTENCY_KEY_LOCK_SECONDS', 120)))
+
+# Paid orders older than the refund window are final; their detail responses are cached indefinitely
+ORDER_REFUND_WINDOW = timedelta(days=int(os.getenv('ORDER_REFUND_WINDOW_DAYS', 14)))
+
+# Unpaid orders are cancelled and their stock returned after this long (manage.py expire_unpaid_orders).
+# Stripe checkout sessions expire at the same time, so it must be between 30 minutes and 24 hours
+ORDER_PAYMENT_DEADLINE = timedelta(minutes=int(os.getenv('ORDER_PAYMENT_DEADLINE_MINUTES', 60)))
+# Extra time after the session expires before the order is cancelled, for webhooks of last-minute payments
+ORDER_PAYMENT_GRACE = timedelta(minutes=int(os.getenv('ORDER_PAYMENT_GRACE_MINUTES', 30)))
+
 import stripe
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Token bucket throttles for anonymous endpoints.
+
+Views set ``throttle_scope`` and pick identities with the throttle classes
+below; the rate for ``<throttle_scope>_<kind>`` comes from
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] (e.g. ``'login_email': '10/min'``).
+A rate of N per period is a bucket of N tokens refilled evenly over the period.
+
+Buckets live in the default cache. On RedisCache the refill and take run
+atomically in a Lua script; other backends update the bucket under a
+process lock, which is only exact within a single process.
+Deciding a request never touches the database.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from backend import metrics
+from cart.guest_session import GUEST_CART_TOKEN_HEADER
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+_lock = threading.Lock()
+
+
+def _redis_client():
+    """
+    Return the redis client of the default cache, or None for other backends.
+    """
+    backend = getattr(cache, '_cache', None)
+    if backend is not None and hasattr(backend, 'get_client'):
+        return backend.get_client(write=True)
+    return None
+
+
+def take_token(key, capacity, refill_rate):
+    """
+    Take one token from the bucket stored under key.
+    Returns an (allowed, wait_seconds) tuple.
+    """
+    client = _redis_client()
+    if client is not None:
+        script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, wait = script(keys=[cache.make_and_validate_key(key)], args=[capacity, refill_rate])
+        return bool(allowed), float(wait)
+
+    with _lock:
+        now = time.time()
+        tokens, updated_at = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0, now - updated_at) * refill_rate)
+        if tokens >= 1:
+            allowed, wait = True, 0
+            tokens -= 1
+        else:
+            allowed, wait = False, (1 - tokens) / refill_rate
+        cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+    return allowed, wait
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Scoped token bucket throttle. Subclasses return the identity to limit
+    from get_identity(); requests without an identity are not limited.
+    """
+    kind = None
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+
+    def __init__(self):
+        # The rate depends on the view, it is resolved in allow_request()
+        pass
+
+    def get_identity(self, request):
+        raise NotImplementedError('.get_identity() must be overridden')
+
+    def get_cache_key(self, request, view):
+        identity = self.get_identity(request)
+        if not identity:
+            return None
+        ident = hashlib.sha256(identity.encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f'{scope}_{self.kind}'
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        try:
+            allowed, self.wait_seconds = take_token(key, self.num_requests, self.num_requests / self.duration)
+        except Exception as e:
+            # An unavailable cache must not take the endpoint down with it
+            metrics.increment('throttle_total', scope=self.scope, outcome='error')
+            logger.warning('event=throttle_error scope=%s error=%s', self.scope, e)
+            return True
+
+        metrics.increment('throttle_total', scope=self.scope, outcome='allowed' if allowed else 'throttled')
+        if not allowed:
+            logger.info('event=throttled scope=%s wait_seconds=%.1f', self.scope, self.wait_seconds)
+        return allowed
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    Limit by client IP address (honours REST_FRAMEWORK['NUM_PROXIES']).
+    """
+    kind = 'ip'
+
+    def get_identity(self, request):
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+    """
+    Limit by the email address in the request body.
+    """
+    kind = 'email'
+
+    def get_identity(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str):
+            return None
+        return email.strip().lower() or None
+
+
+class GuestSessionThrottle(TokenBucketThrottle):
+    """
+    Limit by guest cart token or session cookie, falling back to the client IP.
+    Reads the raw header and cookie, so the session is never loaded.
+    """
+    kind = 'guest'
+
+    def get_identity(self, request):
+        token = request.headers.get(GUEST_CART_TOKEN_HEADER)
+        if token:
+            return f'token:{token}'
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            return f'session:{session_key}'
+        return f'ip:{self.get_ident(request)}'
@@ -18,7 +18,9 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
+from users.views import ThrottledTokenObtainPairView
+from .views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,9 +32,10 @@ urlpatterns = [
     path('api/payments/', include('payments.urls')),
     path('api/checkout/', include('orders.checkout_urls')),
     path('api/vendor/', include('products.vendor_urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 
  # JWT
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
 
@@ -0,0 +1,19 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from . import metrics
+
+
+class MetricsView(APIView):
+    """
+    API endpoint exposing process metrics in the Prometheus text format.
+    GET /api/metrics/
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
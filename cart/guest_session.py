@@ -0,0 +1,95 @@
+"""
+Guest cart identification.
+
+A guest cart is looked up by an opaque cart key (stored in
+``GuestCart.session_key``). The key can travel either in the Django session
+(cookie based clients) or in a signed ``X-Guest-Cart-Token`` header (SPA
+clients), in which case the guest cart never touches the session store.
+"""
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+
+GUEST_CART_TOKEN_HEADER = 'X-Guest-Cart-Token'
+GUEST_CART_SESSION_KEY = 'guest_cart_key'
+GUEST_CART_TOKEN_SALT = 'cart.guest_cart_token'
+
+
+def sign_guest_cart_key(cart_key):
+    """
+    Return a signed, timestamped token for the given cart key.
+    """
+    return signing.dumps(cart_key, salt=GUEST_CART_TOKEN_SALT)
+
+
+def unsign_guest_cart_token(token):
+    """
+    Return the cart key stored in a token, or None if the token is invalid or expired.
+    """
+    try:
+        return signing.loads(
+            token,
+            salt=GUEST_CART_TOKEN_SALT,
+            max_age=settings.GUEST_CART_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return None
+
+
+def uses_guest_cart_token(request):
+    """
+    Check if the guest cart for this request should be tracked without a session.
+    """
+    return GUEST_CART_TOKEN_HEADER in request.headers or not settings.GUEST_CART_USE_SESSION
+
+
+def get_guest_cart_key(request):
+    """
+    Get the cart key of the current guest without creating one.
+    """
+    if uses_guest_cart_token(request):
+        token = request.headers.get(GUEST_CART_TOKEN_HEADER)
+        cart_key = unsign_guest_cart_token(token) if token else None
+    else:
+        session = request.session
+        # No session cookie means no cart - avoid loading the session at all
+        if not session.session_key:
+            return None
+        # Carts created before the cart key was stored in the session
+        # are keyed by the session key itself
+        cart_key = session.get(GUEST_CART_SESSION_KEY) or session.session_key
+
+    if cart_key:
+        request.guest_cart_key = cart_key
+    return cart_key
+
+
+def get_or_create_guest_cart_key(request):
+    """
+    Get the cart key of the current guest, creating a new one if needed.
+    """
+    cart_key = get_guest_cart_key(request)
+    if cart_key:
+        return cart_key
+
+    cart_key = uuid.uuid4().hex
+    if not uses_guest_cart_token(request):
+        request.session[GUEST_CART_SESSION_KEY] = cart_key
+    request.guest_cart_key = cart_key
+    return cart_key
+
+
+class GuestCartTokenMixin:
+    """
+    Return the signed guest cart token in a response header,
+    so token based clients can pick it up from any guest cart response.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cart_key = getattr(request, 'guest_cart_key', None)
+        if cart_key:
+            response[GUEST_CART_TOKEN_HEADER] = sign_guest_cart_key(cart_key)
+        return response
@@ -4,51 +4,47 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from .models import GuestCart, GuestCartItem
 from .serializers import GuestCartSerializer, GuestCartItemSerializer, AddToGuestCartSerializer
+from .guest_session import GuestCartTokenMixin, get_guest_cart_key, get_or_create_guest_cart_key
 from products.models import Product
-import uuid
+from backend.throttling import GuestSessionThrottle, IPThrottle
 
 
-def get_or_create_guest_session(request):
-    """
-    Get or create a session key for guest users.
-    """
-    if not request.session.session_key:
-        request.session.create()
-    return request.session.session_key
-
-
-class GuestCartView(APIView):
+class GuestCartView(GuestCartTokenMixin, APIView):
     """
     API endpoint to get guest cart.
     GET /api/cart/guest
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, GuestSessionThrottle]
+    throttle_scope = 'guest_cart'
     
     def get(self, request):
-        session_key = get_or_create_guest_session(request)
+        cart_key = get_or_create_guest_cart_key(request)
         
         # Get or create guest cart
-        guest_cart, created = GuestCart.objects.get_or_create(session_key=session_key)
+        guest_cart, created = GuestCart.objects.get_or_create(session_key=cart_key)
         
         serializer = GuestCartSerializer(guest_cart)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class AddToGuestCartView(APIView):
+class AddToGuestCartView(GuestCartTokenMixin, APIView):
     """
     API endpoint to add items to guest cart.
     POST /api/cart/guest/add
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, GuestSessionThrottle]
+    throttle_scope = 'guest_cart'
     
     def post(self, request):
         serializer = AddToGuestCartSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        session_key = get_or_create_guest_session(request)
+        cart_key = get_or_create_guest_cart_key(request)
         
         # Get or create guest cart
-        guest_cart, created = GuestCart.objects.get_or_create(session_key=session_key)
+        guest_cart, created = GuestCart.objects.get_or_create(session_key=cart_key)
         
         # Get product
         product_id = serializer.validated_data['product_id']
@@ -110,24 +106,26 @@ class AddToGuestCartView(APIView):
         }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 
-class UpdateGuestCartItemView(APIView):
+class UpdateGuestCartItemView(GuestCartTokenMixin, APIView):
     """
     API endpoint to update quantity of guest cart item.
     PATCH /api/cart/guest/update/:id
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, GuestSessionThrottle]
+    throttle_scope = 'guest_cart'
     
     def patch(self, request, pk):
-        session_key = request.session.session_key
+        cart_key = get_guest_cart_key(request)
         
-        if not session_key:
+        if not cart_key:
             return Response(
                 {'error': 'Nie znaleziono koszyka gościa'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         try:
-            guest_cart = GuestCart.objects.get(session_key=session_key)
+            guest_cart = GuestCart.objects.get(session_key=cart_key)
             cart_item = GuestCartItem.objects.get(pk=pk, cart=guest_cart)
         except (GuestCart.DoesNotExist, GuestCartItem.DoesNotExist):
             return Response(
@@ -175,24 +173,26 @@ class UpdateGuestCartItemView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class RemoveFromGuestCartView(APIView):
+class RemoveFromGuestCartView(GuestCartTokenMixin, APIView):
     """
     API endpoint to remove item from guest cart.
     DELETE /api/cart/guest/remove/:id
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, GuestSessionThrottle]
+    throttle_scope = 'guest_cart'
     
     def delete(self, request, pk):
-        session_key = request.session.session_key
+        cart_key = get_guest_cart_key(request)
         
-        if not session_key:
+        if not cart_key:
             return Response(
                 {'error': 'Nie znaleziono koszyka gościa'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         try:
-            guest_cart = GuestCart.objects.get(session_key=session_key)
+            guest_cart = GuestCart.objects.get(session_key=cart_key)
             cart_item = GuestCartItem.objects.get(pk=pk, cart=guest_cart)
         except (GuestCart.DoesNotExist, GuestCartItem.DoesNotExist):
             return Response(
@@ -210,24 +210,26 @@ class RemoveFromGuestCartView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class ClearGuestCartView(APIView):
+class ClearGuestCartView(GuestCartTokenMixin, APIView):
     """
     API endpoint to clear guest cart.
     DELETE /api/cart/guest/clear
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, GuestSessionThrottle]
+    throttle_scope = 'guest_cart'
     
     def delete(self, request):
-        session_key = request.session.session_key
+        cart_key = get_guest_cart_key(request)
         
-        if not session_key:
+        if not cart_key:
             return Response(
                 {'message': 'Koszyk jest już pusty'},
                 status=status.HTTP_200_OK
             )
         
         try:
-            guest_cart = GuestCart.objects.get(session_key=session_key)
+            guest_cart = GuestCart.objects.get(session_key=cart_key)
             guest_cart.items.all().delete()
             
             cart_serializer = GuestCartSerializer(guest_cart)
@@ -63,7 +63,8 @@ class CartItem(models.Model):
 class GuestCart(models.Model):
     """
     Model representing a shopping cart for a guest (unauthenticated) user.
-    Uses session_key to track the cart.
+    Uses session_key to track the cart - it holds the guest cart key
+    from the session or the signed guest cart token (see cart.guest_session).
     """
     session_key = models.CharField(max_length=255, unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1,3 +1,41 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from products.models import Product
+from .guest_session import GUEST_CART_TOKEN_HEADER, unsign_guest_cart_token
+from .models import GuestCart
+
+
+class GuestCartTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=5,
+        )
+
+    def add_to_cart(self, token):
+        return self.client.post(
+            '/api/cart/guest/add/', {'product_id': self.product.id, 'quantity': 1},
+            format='json', HTTP_X_GUEST_CART_TOKEN=token,
+        )
+
+    def test_token_identifies_cart_without_session(self):
+        response = self.add_to_cart('')
+        token = response[GUEST_CART_TOKEN_HEADER]
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        response = self.add_to_cart(token)
+        self.assertEqual(response.status_code, 200)
+        cart = GuestCart.objects.get()
+        self.assertEqual(cart.session_key, unsign_guest_cart_token(token))
+        self.assertEqual(cart.items.get().quantity, 2)
 
-# Create your tests here.
+    def test_tampered_token_starts_a_new_cart(self):
+        token = self.add_to_cart('')[GUEST_CART_TOKEN_HEADER]
+        self.add_to_cart(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+        self.assertEqual(GuestCart.objects.count(), 2)
@@ -104,7 +104,8 @@ def create_sample_orders():
                 product=product,
                 quantity=quantity,
                 price=product.price,
-                selected_format=selected_format
+                selected_format=selected_format,
+                vendor_company_id=product.vendor_company_id
             )
         
         orders_created += 1
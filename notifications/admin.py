@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'recipient_list']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+    list_per_page = 25
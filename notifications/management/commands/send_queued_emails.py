@@ -0,0 +1,16 @@
+"""
+Deliver emails queued in the outbox.
+
+Run with: python manage.py send_queued_emails --loop
+"""
+from backend.jobs import PollingCommand
+from notifications.outbox import deliver_batch
+
+
+class Command(PollingCommand):
+    help = 'Deliver queued emails in batches over a reused SMTP connection.'
+    batch_size = 50
+    summary = 'Processed {} queued emails.'
+
+    def process(self, options):
+        return deliver_batch(options['batch_size'])
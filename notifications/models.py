@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+    Model representing an email waiting in the outbox.
+    Emails are written in the same transaction as the change they describe
+    and delivered later by the send_queued_emails worker.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Oczekujący'),
+        ('sent', 'Wysłany'),
+        ('failed', 'Nieudany'),
+    ]
+    
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient_list = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'wiadomość email'
+        verbose_name_plural = 'wiadomości email'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipient_list)} ({self.status})"
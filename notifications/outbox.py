@@ -0,0 +1,120 @@
+"""
+Transactional email outbox.
+
+Request handlers call enqueue_email() inside their transaction, which costs a
+single INSERT. The send_queued_emails worker delivers queued emails in batches
+over one reused SMTP connection, retrying failures with exponential backoff.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from backend import metrics
+from backend.jobs import claim_due
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed email stays invisible to other workers
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """
+    Queue an email for delivery. Call inside the transaction of the change it describes.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list=list(recipient_list),
+    )
+
+
+def enqueue_emails(emails, from_email=None):
+    """
+    Queue many (subject, message, recipient_list) emails with a single INSERT.
+    """
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(
+            subject=subject,
+            message=message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipient_list=list(recipient_list),
+        )
+        for subject, message, recipient_list in emails
+    ])
+
+
+def get_retry_delay(attempts):
+    """
+    Exponential backoff with jitter for the given number of failed attempts.
+    """
+    base = settings.EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS
+    delay = min(base * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_MAX_RETRY_DELAY_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """
+    Claim due emails, skipping rows locked by other workers.
+    """
+    return claim_due(OutgoingEmail.objects.all(), CLAIM_TIMEOUT, limit=batch_size)
+
+
+def deliver_batch(batch_size=50):
+    """
+    Deliver one batch of due emails over a single SMTP connection.
+    Returns the number of emails processed.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Sending below retries the connection and records the failure per email
+        logger.warning('event=email_connection_failed error=%s', e)
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.message,
+                from_email=email.from_email,
+                to=email.recipient_list,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                email.last_error = str(e)
+                if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    email.status = 'failed'
+                else:
+                    email.next_attempt_at = timezone.now() + get_retry_delay(email.attempts)
+                metrics.increment('email_outbox_total', outcome='error')
+                logger.warning('event=email_failed email_id=%s attempts=%d error=%s', email.id, email.attempts, e)
+                # Reconnect for the remaining messages in case the connection broke
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                metrics.increment('email_outbox_total', outcome='sent')
+    finally:
+        connection.close()
+
+    OutgoingEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+    )
+    return len(emails)
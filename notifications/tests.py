@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import OutgoingEmail
+from .outbox import deliver_batch, enqueue_email
+
+send_messages = EmailBackend.send_messages
+
+
+def fail_for_bounce(backend, messages):
+    if messages[0].to == ['bounce@example.com']:
+        raise OSError('Connection unexpectedly closed')
+    return send_messages(backend, messages)
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxDeliveryTests(TestCase):
+    @mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=fail_for_bounce)
+    def test_failed_email_is_retried_with_backoff_then_given_up(self, _):
+        failing = enqueue_email('Zamówienie', 'Treść', ['bounce@example.com'])
+        sent = enqueue_email('Zamówienie', 'Treść', ['anna@example.com'])
+
+        self.assertEqual(deliver_batch(), 2)
+
+        failing.refresh_from_db()
+        sent.refresh_from_db()
+        self.assertEqual(sent.status, 'sent')
+        self.assertEqual([message.to for message in mail.outbox], [['anna@example.com']])
+        self.assertEqual(failing.status, 'pending')
+        self.assertEqual(failing.attempts, 1)
+        self.assertGreater(failing.next_attempt_at, timezone.now())
+        self.assertIn('Connection unexpectedly closed', failing.last_error)
+
+        # Not due yet
+        self.assertEqual(deliver_batch(), 0)
+
+        OutgoingEmail.objects.filter(pk=failing.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_batch(), 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'failed')
+        self.assertEqual(failing.attempts, 2)
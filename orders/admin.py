@@ -5,7 +5,12 @@ from .models import Order, OrderItem, GuestOrderAddress
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ['subtotal']
+    fields = ['product_title', 'product_author', 'product_isbn', 'selected_format', 'quantity', 'price', 'subtotal']
+    readonly_fields = ['product_title', 'product_author', 'product_isbn', 'subtotal']
+
+    def has_add_permission(self, request, obj=None):
+        # Items are created by checkout together with their product snapshot
+        return False
 
 
 class GuestOrderAddressInline(admin.StackedInline):
@@ -0,0 +1,63 @@
+"""
+Response cache for finalized order details.
+
+A paid order past the refund window no longer changes, so its serialized
+detail is cached without a timeout. Entries are keyed on (order id, updated_at)
+behind a per-order pointer. Eviction deletes the pointer, so a status change
+never serves the old representation.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+KEY_PREFIX = 'orders:detail'
+
+
+def get_pointer_key(order_id):
+    return f'{KEY_PREFIX}:{order_id}'
+
+
+def get_entry_key(order_id, updated_at):
+    return f'{KEY_PREFIX}:{order_id}:{updated_at.isoformat()}'
+
+
+def is_finalized(order):
+    """
+    Check if the order can no longer change: paid and past the refund window.
+    """
+    return (
+        order.payment_status == 'paid'
+        and order.updated_at <= timezone.now() - settings.ORDER_REFUND_WINDOW
+    )
+
+
+def get_cached_order_detail(order_id, user_id):
+    """
+    Return cached serialized data of the user's order, or None.
+    Served from the cache only, without database queries.
+    """
+    entry_key = cache.get(get_pointer_key(order_id))
+    if entry_key is None:
+        return None
+    entry = cache.get(entry_key)
+    if entry is None or entry['user_id'] != user_id:
+        return None
+    return entry['data']
+
+
+def cache_order_detail(order, data):
+    """
+    Store serialized data of a finalized order. Other orders are not cached.
+    """
+    if not is_finalized(order):
+        return
+    entry_key = get_entry_key(order.id, order.updated_at)
+    cache.set(entry_key, {'user_id': order.user_id, 'data': data}, timeout=None)
+    cache.set(get_pointer_key(order.id), entry_key, timeout=None)
+
+
+def invalidate_order_detail(order_id):
+    """
+    Evict the cached detail of an order. Call after changing an order with queryset.update().
+    """
+    cache.delete(get_pointer_key(order_id))
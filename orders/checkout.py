@@ -0,0 +1,262 @@
+"""
+Checkout pipeline shared by all checkout entry points.
+
+Checkout runs as explicit stages:
+load cart -> validate stock -> compute total -> create order -> decrement stock -> clear cart.
+Every stage reports its duration and query count as metrics and structured logs.
+"""
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend import metrics
+from notifications.outbox import enqueue_email
+from products.stock import InsufficientStock, aggregate_quantities, release_stock_for_orders, reserve_stock
+from .emails import guest_order_confirmation
+from .idempotency import mark_idempotency_key_committed
+from .models import Order, OrderItem, GuestOrderAddress
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    """
+    Raised when checkout cannot be completed. The message is safe to show to the client.
+    """
+    def __init__(self, message, status_code=400):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def checkout_stage(name):
+    """
+    Decorator measuring a pipeline method as a checkout stage.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.measure(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class CheckoutPipeline:
+    """
+    Checkout of a user's cart.
+    """
+    messages = {
+        'empty_cart': 'Cart is empty.',
+        'insufficient_stock': 'Insufficient stock for {title}. Only {stock} available.',
+        'reservation_failed': 'Insufficient stock for {titles}.',
+    }
+    order_defaults = {'order_type': 'user'}
+
+    def __init__(self, cart, entry_point, idempotency_record=None):
+        self.cart = cart
+        self.entry_point = entry_point
+        # Idempotency-Key of the request, marked committed together with the order
+        self.idempotency_record = idempotency_record
+        self.cart_items = []
+        self.total_amount = 0
+        self.order = None
+        self.order_items = []
+        self.timings = {}
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        Measure duration and query count of a block of checkout work.
+        """
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                yield
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.timings[stage] = {'duration_ms': round(duration_ms, 2), 'queries': queries}
+            metrics.observe('checkout_stage_duration_ms', duration_ms, entry_point=self.entry_point, stage=stage)
+            metrics.observe('checkout_stage_queries', queries, entry_point=self.entry_point, stage=stage)
+            logger.info(
+                'event=checkout_stage entry_point=%s stage=%s duration_ms=%.2f queries=%d',
+                self.entry_point, stage, duration_ms, queries,
+                extra={'entry_point': self.entry_point, 'stage': stage, 'duration_ms': duration_ms, 'queries': queries}
+            )
+
+    def run(self, clear_cart=True, **order_fields):
+        """
+        Run checkout in a single transaction and return the created order.
+        Raises CheckoutError if the cart cannot be checked out.
+        """
+        outcome = 'error'
+        try:
+            with self.measure('checkout'), transaction.atomic():
+                self.load_cart()
+                self.validate_stock()
+                self.compute_total()
+                self.create_order(**order_fields)
+                self.decrement_stock()
+                mark_idempotency_key_committed(self.idempotency_record)
+                if clear_cart:
+                    self.clear_cart()
+            outcome = 'success'
+        except CheckoutError:
+            outcome = 'rejected'
+            raise
+        finally:
+            metrics.increment('checkout_total', entry_point=self.entry_point, outcome=outcome)
+        return self.order
+
+    def get_cart_items(self):
+        if self.cart is None:
+            return []
+        return list(self.cart.items.select_related('product'))
+
+    @checkout_stage('load_cart')
+    def load_cart(self):
+        self.cart_items = self.get_cart_items()
+        if not self.cart_items:
+            raise CheckoutError(self.messages['empty_cart'])
+
+    @checkout_stage('validate_stock')
+    def validate_stock(self):
+        for item in self.cart_items:
+            if item.quantity > item.product.stock:
+                raise CheckoutError(self.messages['insufficient_stock'].format(
+                    title=item.product.title, stock=item.product.stock
+                ))
+
+    @checkout_stage('compute_total')
+    def compute_total(self):
+        self.total_amount = sum(item.subtotal for item in self.cart_items)
+
+    @checkout_stage('create_order')
+    def create_order(self, **order_fields):
+        self.order = Order.objects.create(
+            total_amount=self.total_amount,
+            payment_status='pending',
+            **{**self.order_defaults, **order_fields}
+        )
+        self.order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=self.order,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.product.price,
+                selected_format=item.selected_format,
+                product_title=item.product.title,
+                product_author=item.product.author,
+                product_isbn=item.product.isbn or '',
+                vendor_company_id=item.product.vendor_company_id,
+            )
+            for item in self.cart_items
+        ])
+        self.create_related()
+
+    def create_related(self):
+        """
+        Hook for creating records that belong to the new order.
+        """
+
+    @checkout_stage('decrement_stock')
+    def decrement_stock(self):
+        try:
+            reserve_stock(aggregate_quantities(self.cart_items))
+        except InsufficientStock as e:
+            titles = ', '.join(item.product.title for item in self.cart_items if item.product_id in e.product_ids)
+            raise CheckoutError(self.messages['reservation_failed'].format(titles=titles))
+
+    @checkout_stage('clear_cart')
+    def clear_cart(self):
+        # Only remove the items that were ordered
+        item_model = type(self.cart_items[0])
+        item_model.objects.filter(id__in=[item.id for item in self.cart_items]).delete()
+
+
+class GuestCheckoutPipeline(CheckoutPipeline):
+    """
+    Checkout of a guest cart, creating the delivery address along with the order.
+    """
+    messages = {
+        'empty_cart': 'Koszyk jest pusty. Dodaj produkty przed zakupem.',
+        'insufficient_stock': 'Produkt "{title}" nie ma wystarczającej ilości w magazynie. Dostępne: {stock}',
+        'reservation_failed': 'Produkty {titles} nie mają wystarczającej ilości w magazynie.',
+    }
+    order_defaults = {'order_type': 'guest', 'user': None}
+
+    def __init__(self, cart, entry_point, address_data, idempotency_record=None):
+        super().__init__(cart, entry_point, idempotency_record)
+        self.address_data = address_data
+        self.address = None
+
+    def create_related(self):
+        self.address = GuestOrderAddress.objects.create(order=self.order, **self.address_data)
+        # Queued in the checkout transaction, delivered by the outbox worker
+        subject, message = guest_order_confirmation(self.order, self.order_items, self.address)
+        enqueue_email(subject, message, [self.order.guest_email])
+
+
+def release_unpaid_orders(order_ids, payment_status='failed'):
+    """
+    Mark pending orders with the given status and return their reserved stock.
+    Orders that are no longer pending are skipped, so stock is released only once.
+    Returns the ids of the released orders.
+    """
+    with transaction.atomic():
+        released_ids = list(
+            Order.objects
+            .select_for_update()
+            .filter(id__in=order_ids, payment_status='pending')
+            .values_list('id', flat=True)
+        )
+        if released_ids:
+            Order.objects.filter(id__in=released_ids).update(payment_status=payment_status, updated_at=timezone.now())
+            release_stock_for_orders(released_ids)
+    return released_ids
+
+
+def mark_orders_paid(order_ids):
+    """
+    Mark orders paid after their payment succeeded. Returns the ids of the orders moved to paid.
+
+    Pending orders still hold their stock. Failed orders had it returned by
+    release_unpaid_orders, so it is reserved again; an order whose stock is
+    gone meanwhile stays failed and is logged to be refunded.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects
+            .select_for_update()
+            .filter(id__in=order_ids, payment_status__in=['pending', 'failed'])
+            .values_list('id', 'payment_status')
+        )
+        paid_ids = [order_id for order_id, payment_status in orders if payment_status == 'pending']
+        for order_id in [order_id for order_id, payment_status in orders if payment_status == 'failed']:
+            try:
+                reserve_stock(aggregate_quantities(OrderItem.objects.filter(order_id=order_id)))
+            except InsufficientStock as e:
+                metrics.increment('payment_for_closed_order_total', outcome='needs_refund')
+                logger.warning(
+                    'event=payment_for_closed_order order_id=%s outcome=needs_refund product_ids=%s',
+                    order_id, sorted(e.product_ids),
+                )
+                continue
+            metrics.increment('payment_for_closed_order_total', outcome='restocked')
+            logger.warning('event=payment_for_closed_order order_id=%s outcome=restocked', order_id)
+            paid_ids.append(order_id)
+
+        if paid_ids:
+            Order.objects.filter(id__in=paid_ids).update(payment_status='paid', updated_at=timezone.now())
+    return paid_ids
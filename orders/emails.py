@@ -0,0 +1,89 @@
+"""
+Order email messages.
+
+Builders only format data that is already loaded, so they can run inside
+the checkout transaction without extra queries.
+"""
+from django.utils import timezone
+
+
+def format_items(items, currency='PLN'):
+    """
+    Format order items as a list for an email body.
+    """
+    lines = []
+    for item in items:
+        format_str = f" ({item.get_selected_format_display()})" if item.selected_format else ""
+        lines.append(f"- {item.product_title}{format_str} x {item.quantity} - {item.subtotal} {currency}")
+    return "\n".join(lines)
+
+
+def guest_order_confirmation(order, items, address):
+    """
+    Build the confirmation email for a guest order.
+    Returns a (subject, message) tuple.
+    """
+    subject = f'Potwierdzenie zamówienia #{order.id}'
+    message = f"""
+Dziękujemy za złożenie zamówienia!
+
+Szczegóły zamówienia:
+Numer zamówienia: #{order.id}
+Data: {timezone.localtime(order.created_at).strftime('%d.%m.%Y %H:%M')}
+
+Dane zamawiającego:
+Imię i nazwisko: {order.guest_first_name} {order.guest_last_name}
+Email: {order.guest_email}
+Telefon: {order.guest_phone}
+
+Adres dostawy:
+{address.recipient_name}
+{address.street}
+{address.postal_code} {address.city}
+{address.country}
+Tel: {address.phone}
+
+Zamówione produkty:
+{format_items(items)}
+
+Łącznie: {order.total_amount} PLN
+
+Status płatności: {order.get_payment_status_display()}
+
+Aby dokończyć zamówienie, prosimy o dokonanie płatności.
+
+Pozdrawiamy,
+Zespół Księgarni
+"""
+    return subject, message
+
+
+def paid_order_confirmation(order, items):
+    """
+    Build the confirmation email sent after a successful payment.
+    Returns a (subject, message) tuple.
+    """
+    subject = f'Potwierdzenie zamówienia - Zamówienie #{order.id}'
+    items_list = '\n'.join([
+        f"- {item.product_title} x {item.quantity} = {item.subtotal} zł"
+        for item in items
+    ])
+    message = f"""
+Szanowny Kliencie {order.user.email},
+
+Dziękujemy za złożenie zamówienia!
+
+Szczegóły zamówienia:
+Numer zamówienia: #{order.id}
+Łączna kwota: {order.total_amount} zł
+Status płatności: {order.get_payment_status_display()}
+
+Produkty:
+{items_list}
+
+Twoje zamówienie zostanie wkrótce przetworzone.
+
+Pozdrawiamy,
+Zespół E-commerce
+        """
+    return subject, message
@@ -0,0 +1,192 @@
+"""
+Idempotency-Key support for order and checkout creation.
+
+The first request with a given key stores its response; retries with the same
+key return the stored response bytes without running checkout again.
+
+While a request runs it holds the key for IDEMPOTENCY_KEY_LOCK_TIMEOUT, so a
+retry of a request whose worker was killed can take the key over. Once the
+checkout transaction has committed an order the key is marked committed and
+is never taken over or released, even if the request fails afterwards.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from cart.guest_session import get_guest_cart_key
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENT_REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_idempotency_scope(request):
+    """
+    Return the owner of idempotency keys for this request, or None if there is none.
+    """
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    cart_key = get_guest_cart_key(request)
+    if cart_key:
+        return f'guest:{cart_key}'
+    return None
+
+
+def get_request_hash(request):
+    """
+    Fingerprint the request, so a key reused for a different request can be detected.
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def reserve_idempotency_key(key, scope, request):
+    """
+    Insert a record for the key, or return the existing one.
+    Returns a (record, created) tuple; created is also True when an abandoned
+    key was taken over.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key,
+                scope=scope,
+                request_path=request.path,
+                request_hash=get_request_hash(request),
+                locked_until=now + settings.IDEMPOTENCY_KEY_LOCK_TIMEOUT,
+                expires_at=now + settings.IDEMPOTENCY_KEY_TTL,
+            )
+        return record, True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(scope=scope, key=key)
+
+    if record.expires_at <= now:
+        # Expired keys that were not purged yet can be reused
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+        return reserve_idempotency_key(key, scope, request)
+
+    if record.request_hash == get_request_hash(request) and take_over_idempotency_key(record, now):
+        return record, True
+    return record, False
+
+
+def take_over_idempotency_key(record, now):
+    """
+    Claim an incomplete key whose request died without committing anything.
+    The conditional UPDATE lets only one retry win.
+    """
+    locked_until = now + settings.IDEMPOTENCY_KEY_LOCK_TIMEOUT
+    taken = IdempotencyKey.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now),
+        pk=record.pk, status_code__isnull=True, committed_at__isnull=True,
+    ).update(locked_until=locked_until)
+    if taken:
+        record.locked_until = locked_until
+    return bool(taken)
+
+
+def get_idempotency_record(request):
+    """
+    Return the key record held by this request, or None if it was sent without a key.
+    """
+    return getattr(request, 'idempotency_record', None)
+
+
+def mark_idempotency_key_committed(record):
+    """
+    Record that the request committed its order. Call inside the checkout transaction,
+    so the mark commits or rolls back together with the order.
+    """
+    if record is not None:
+        IdempotencyKey.objects.filter(pk=record.pk).update(committed_at=timezone.now())
+
+
+def release_idempotency_key(record):
+    """
+    Delete the key unless its request already committed an order, so the client can retry.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, committed_at__isnull=True).delete()
+
+
+def replay_response(record):
+    """
+    Build a response from the stored status code and body.
+    """
+    response = HttpResponse(
+        bytes(record.response_body),
+        status=record.status_code,
+        content_type=record.content_type,
+    )
+    response[IDEMPOTENT_REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(handler):
+    """
+    Decorator for APIView handlers honouring the Idempotency-Key header.
+
+    Only successful responses are stored. The key of a failed request is
+    released so the client can retry, unless the request already committed
+    its order: then retries get 409 and the order is finished by the
+    reconciliation jobs. Handlers returning an error response after
+    committing must have undone the order (e.g. release_unpaid_orders).
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return handler(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response(
+                {'error': f'{IDEMPOTENCY_KEY_HEADER} header is too long (max 255 characters).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = get_idempotency_scope(request)
+        if scope is None:
+            return handler(self, request, *args, **kwargs)
+
+        record, created = reserve_idempotency_key(key, scope, request)
+        if not created:
+            if record.request_hash != get_request_hash(request):
+                return Response(
+                    {'error': f'{IDEMPOTENCY_KEY_HEADER} was already used for a different request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if not record.is_completed:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return replay_response(record)
+
+        request.idempotency_record = record
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except Exception:
+            release_idempotency_key(record)
+            raise
+
+        if not status.is_success(response.status_code):
+            record.delete()
+            return response
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code,
+            response_body=JSONRenderer().render(response.data),
+            content_type='application/json',
+        )
+        return response
+    return wrapper
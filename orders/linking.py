@@ -0,0 +1,36 @@
+"""
+Linking guest orders to accounts.
+
+Guest orders are matched to accounts by LOWER(guest_email), served by the
+partial orders_guest_email_idx index. Linked orders keep order_type='guest'
+(their address stays in GuestOrderAddress) and appear in the account's history.
+
+Orders are linked only after the user proved they own the email by
+following a password reset link; registering with an address proves nothing.
+"""
+import logging
+
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+
+def unlinked_guest_orders():
+    return Order.objects.filter(order_type='guest', user__isnull=True).alias(guest_email_lower=Lower('guest_email'))
+
+
+def link_guest_orders(user):
+    """
+    Attach the guest orders placed with the user's email to the account with a single UPDATE.
+    Returns the number of orders linked.
+    """
+    linked = unlinked_guest_orders().filter(guest_email_lower=user.email.lower()).update(
+        user=user, updated_at=timezone.now()
+    )
+    if linked:
+        logger.info('event=guest_orders_linked user_id=%s orders=%d', user.pk, linked)
+    return linked
+
@@ -0,0 +1,47 @@
+"""
+Fill product snapshot fields of order items created before they existed.
+
+Run with: python manage.py backfill_order_item_snapshots
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from orders.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Copy product title, author and ISBN into order items without a snapshot, in id-range chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = OrderItem.objects.filter(product_title='').aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('All order items already have a snapshot.'))
+            return
+
+        updated_total = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            # Each chunk commits on its own, so a long backfill does not hold locks
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE orders_orderitem AS oi
+                    SET product_title = p.title,
+                        product_author = p.author,
+                        product_isbn = COALESCE(p.isbn, '')
+                    FROM products_product AS p
+                    WHERE p.id = oi.product_id
+                      AND oi.id >= %s AND oi.id < %s
+                      AND oi.product_title = ''
+                    """,
+                    [start, start + batch_size]
+                )
+                updated_total += cursor.rowcount
+            start += batch_size
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {updated_total} order items.'))
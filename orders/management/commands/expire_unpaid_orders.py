@@ -0,0 +1,58 @@
+"""
+Cancel Stripe checkout orders that were not paid before the payment deadline and return their stock.
+
+Only orders with a Payment (created by CreateCheckoutSessionView) expire.
+Guest and /api/orders/create/ orders are paid later and are left alone.
+The cutoff is ORDER_PAYMENT_GRACE past the session expiry, so webhooks of
+payments completed just before it still find the order pending.
+
+Run with: python manage.py expire_unpaid_orders
+"""
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from backend import metrics
+from orders.checkout import release_unpaid_orders
+from orders.models import Order
+from payments.models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Mark pending checkout orders past ORDER_PAYMENT_DEADLINE as failed and restore their stock in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - settings.ORDER_PAYMENT_DEADLINE - settings.ORDER_PAYMENT_GRACE
+        expired_total = 0
+
+        while True:
+            # Oldest first, using the (payment_status, created_at) index
+            order_ids = list(
+                Order.objects
+                .filter(payment_status='pending', created_at__lt=cutoff, payment__isnull=False)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            with transaction.atomic():
+                expired_ids = release_unpaid_orders(order_ids, payment_status='failed')
+                Payment.objects.filter(order_id__in=expired_ids, status='pending').update(
+                    status='failed', updated_at=timezone.now()
+                )
+
+            expired_total += len(expired_ids)
+            metrics.increment('orders_expired_total', len(expired_ids))
+            logger.info('event=orders_expired count=%d', len(expired_ids))
+
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired_total} unpaid orders.'))
@@ -0,0 +1,32 @@
+"""
+Delete expired Idempotency-Key records.
+
+Run with: python manage.py purge_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        deleted_total = 0
+
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+            deleted_total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted_total} expired idempotency keys.'))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_guest_email_order_guest_first_name_and_more'),
+        ('users', '0006_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='user_address',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='users.address'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_idempotencykey'),
+        ('users', '0006_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='orders_order_user_history_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_orderitem_product_snapshot'),
+        ('users', '0006_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', 'created_at'], name='orders_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:33
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_alter_order_user'),
+        ('users', '0010_dataexportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('guest_email'), condition=models.Q(('order_type', 'guest'), ('user__isnull', True)), name='orders_guest_email_idx'),
+        ),
+    ]
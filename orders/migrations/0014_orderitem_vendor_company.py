@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_idempotency_key_lease'),
+        ('products', '0006_remove_product_products_pr_vendor__16bf37_idx_and_more'),
+        ('users', '0011_private_export_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='vendor_company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='users.vendorcompany'),
+        ),
+        # Earlier items get the product's current vendor, which the rollups used so far
+        migrations.RunSQL(
+            """
+            UPDATE orders_orderitem AS oi
+            SET vendor_company_id = p.vendor_company_id
+            FROM products_product AS p
+            WHERE p.id = oi.product_id AND p.vendor_company_id IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
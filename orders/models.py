@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.conf import settings
 from products.models import Product
 
@@ -20,7 +21,8 @@ class Order(models.Model):
     ]
     
     order_type = models.CharField(max_length=10, choices=ORDER_TYPE_CHOICES, default='user')
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders', null=True, blank=True)
+    # Orders outlive deleted accounts (users.deletion anonymizes them)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='orders', null=True, blank=True)
     user_address = models.ForeignKey('users.Address', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
 
     # Guest order fields
@@ -38,10 +40,21 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'zamówienie'
         verbose_name_plural = 'zamówienia'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_order_user_history_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='orders_status_created_idx'),
+            # Guest orders not linked to an account yet, looked up by email (orders.linking)
+            models.Index(
+                Lower('guest_email'), name='orders_guest_email_idx',
+                condition=models.Q(order_type='guest', user__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         if self.order_type == 'guest':
             return f"Order #{self.id} - {self.guest_email} (Gość)"
+        if self.user is None:
+            return f"Order #{self.id} - (konto usunięte)"
         return f"Order #{self.id} - {self.user.email}"
     
     @property
@@ -84,6 +97,15 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     selected_format = models.CharField(max_length=20, choices=FORMAT_CHOICES, null=True, blank=True)
+
+    # Product details at purchase time, so order reads do not join products
+    product_title = models.CharField(max_length=255, blank=True, default='')
+    product_author = models.CharField(max_length=255, blank=True, default='')
+    product_isbn = models.CharField(max_length=13, blank=True, default='')
+    # Vendor of the product at purchase time; sales rollups are attributed to it
+    vendor_company = models.ForeignKey(
+        'users.VendorCompany', on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items'
+    )
     
     class Meta:
         verbose_name = 'pozycja zamówienia'
@@ -91,9 +113,44 @@ class OrderItem(models.Model):
     
     def __str__(self):
         format_str = f" ({self.get_selected_format_display()})" if self.selected_format else ""
-        return f"{self.quantity}x {self.product.title}{format_str} in Order #{self.order.id}"
+        return f"{self.quantity}x {self.product_title}{format_str} in Order #{self.order_id}"
     
     @property
     def subtotal(self):
         """Calculate subtotal for this order item."""
         return self.quantity * self.price
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model storing the response of a request sent with an Idempotency-Key header,
+    so retries of the same request return the stored response.
+    """
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255, help_text="Właściciel klucza: użytkownik lub koszyk gościa")
+    request_path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.BinaryField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    # Lease of the request processing the key; an incomplete key can be taken over once it runs out
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Set in the checkout transaction: the order exists, so the request must never run again
+    committed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = 'klucz idempotencji'
+        verbose_name_plural = 'klucze idempotencji'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='orders_idempotencykey_scope_key_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+    
+    @property
+    def is_completed(self):
+        """Check if the original request has finished."""
+        return self.status_code is not None
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderHistoryPagination(CursorPagination):
+    """
+    Keyset pagination for order history.
+    Pages are read with an indexed range query on (user, created_at, id),
+    so deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
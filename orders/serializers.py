@@ -1,20 +1,19 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, GuestOrderAddress
-from products.serializers import ProductSerializer
 import re
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """
     Serializer for the OrderItem model.
+    Product details come from the snapshot taken at purchase time.
     """
-    product_details = ProductSerializer(source='product', read_only=True)
     subtotal = serializers.ReadOnlyField()
     
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_details', 'quantity', 'price', 'selected_format', 'subtotal']
-        read_only_fields = ['id']
+        fields = ['id', 'product', 'product_title', 'product_author', 'product_isbn', 'quantity', 'price', 'selected_format', 'subtotal']
+        read_only_fields = ['id', 'product_title', 'product_author', 'product_isbn']
     
     def validate_quantity(self, value):
         """
@@ -48,6 +47,20 @@ class OrderSerializer(serializers.ModelSerializer):
         return value
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Lean serializer for order history lists, without nested items.
+    Expects the queryset to be annotated with item_count.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+    is_paid = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Order
+        fields = ['id', 'created_at', 'total_amount', 'payment_status', 'is_paid', 'item_count']
+        read_only_fields = fields
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating orders with items.
@@ -75,7 +88,9 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             except Address.DoesNotExist:
                 pass
         for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+            OrderItem.objects.create(
+                order=order, vendor_company_id=item_data['product'].vendor_company_id, **item_data
+            )
         return order
 
 
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_order_detail
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def evict_order_detail(sender, instance, **kwargs):
+    """
+    Evict the cached order detail whenever the order is saved, e.g. on refund.
+    """
+    invalidate_order_detail(instance.pk)
@@ -1,3 +1,300 @@
-from django.test import TestCase
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from cart.models import Cart, CartItem
+from payments.models import Payment
+from products.models import Product
+from users.models import CustomUser, PasswordResetToken
+from .idempotency import get_request_hash
+from .models import IdempotencyKey, Order, OrderItem
+from .views import CreateOrderView
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Row locking semantics are tested on PostgreSQL')
+class OversellTests(TransactionTestCase):
+    """
+    Concurrent checkouts for the last copies of a product never sell more than the stock.
+    """
+    buyers = 12
+    stock = 3
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=self.stock,
+        )
+        users = []
+        for i in range(self.buyers):
+            user = CustomUser.objects.create_user(email=f'buyer-{i}@example.com')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1, selected_format='paperback')
+            users.append(user)
+
+        factory = APIRequestFactory()
+        view = CreateOrderView.as_view()
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy(user):
+            request = factory.post('/api/orders/create/')
+            force_authenticate(request, user=user)
+            try:
+                barrier.wait()
+                results.append(view(request).status_code)
+            except Exception as e:
+                results.append(repr(e))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        product.refresh_from_db()
+        self.assertEqual(sorted(results), [201] * self.stock + [400] * (self.buyers - self.stock))
+        self.assertEqual(Order.objects.filter(items__product=product).count(), self.stock)
+        self.assertEqual(product.stock, 0)
+
+
+class GuestOrderLinkingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.order = Order.objects.create(
+            order_type='guest', guest_email='Anna@Example.com', guest_first_name='Anna',
+            total_amount=Decimal('10.00'),
+        )
+
+    def test_registration_does_not_link_guest_orders(self):
+        response = self.client.post('/api/users/register/', {
+            'email': 'anna@example.com', 'password': 'secret-pass-1', 'password_confirm': 'secret-pass-1',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.user_id)
+
+    def test_password_reset_links_guest_orders(self):
+        user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        token = PasswordResetToken.objects.create(user=user, expires_at=timezone.now() + timedelta(hours=1))
+        response = self.client.post('/api/users/reset-password/', {
+            'token': str(token.token), 'password': 'secret-pass-2', 'password_confirm': 'secret-pass-2',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.user_id, user.id)
+
+
+class ExpireUnpaidOrdersTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=5,
+        )
+
+    def create_order(self, age, with_payment=True, order_type='user'):
+        order = Order.objects.create(order_type=order_type, total_amount=Decimal('10.00'))
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal('10.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+        if with_payment:
+            Payment.objects.create(order=order, amount=order.total_amount)
+        return order
+
+    def test_expires_only_checkout_orders_past_grace(self):
+        overdue = settings.ORDER_PAYMENT_DEADLINE + settings.ORDER_PAYMENT_GRACE + timedelta(minutes=1)
+        expired = self.create_order(overdue)
+        in_grace = self.create_order(settings.ORDER_PAYMENT_DEADLINE + timedelta(minutes=1))
+        pay_later = self.create_order(overdue, with_payment=False, order_type='guest')
+
+        call_command('expire_unpaid_orders', stdout=StringIO())
+
+        statuses = dict(Order.objects.values_list('id', 'payment_status'))
+        self.assertEqual(statuses[expired.id], 'failed')
+        self.assertEqual(statuses[in_grace.id], 'pending')
+        self.assertEqual(statuses[pay_later.id], 'pending')
+        self.assertEqual(Payment.objects.get(order=expired).status, 'failed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=10,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+
+    def post(self, path='/api/orders/create/', key='key-1', data=None):
+        return self.client.post(path, data or {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        self.fill_cart()
+        first = self.post()
+        self.fill_cart()
+        retry = self.post()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self.fill_cart()
+        self.post()
+        self.assertEqual(self.post(data={'note': 'other'}).status_code, 422)
+
+    def test_key_of_running_request_conflicts(self):
+        self.fill_cart()
+        IdempotencyKey.objects.create(
+            key='key-1', scope=f'user:{self.user.pk}', request_path='/api/orders/create/',
+            request_hash=self.hash_of_empty_post(), locked_until=timezone.now() + timedelta(minutes=1),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.post().status_code, 409)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_key_of_dead_request_is_taken_over(self):
+        self.fill_cart()
+        IdempotencyKey.objects.create(
+            key='key-1', scope=f'user:{self.user.pk}', request_path='/api/orders/create/',
+            request_hash=self.hash_of_empty_post(), locked_until=timezone.now() - timedelta(seconds=1),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway', STRIPE_WEBHOOK_SECRET='whsec_test')
+    def test_key_is_kept_when_checkout_fails_after_commit(self):
+        self.fill_cart()
+        with mock.patch('payments.views.complete_checkout', side_effect=RuntimeError('lost connection')):
+            with self.assertRaises(RuntimeError):
+                self.post('/api/payments/create-checkout-session/')
+
+        record = IdempotencyKey.objects.get(key='key-1')
+        self.assertIsNotNone(record.committed_at)
+        # Even after the lease runs out, a retry must not create a second order
+        IdempotencyKey.objects.filter(pk=record.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post('/api/payments/create-checkout-session/').status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def hash_of_empty_post(self):
+        return get_request_hash(mock.Mock(method='POST', path='/api/orders/create/', data={}))
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=10,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_list_every_order_once_newest_first(self):
+        created_at = timezone.now()
+        orders = []
+        for i in range(5):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal('10.00'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal('10.00'))
+            orders.append(order)
+        # Ties on created_at are broken by id
+        Order.objects.filter(user=self.user).update(created_at=created_at)
+        Order.objects.create(user=CustomUser.objects.create_user(email='other@example.com'), total_amount=1)
+
+        seen = []
+        url = '/api/orders/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(page['results'])
+            url = page['next']
+
+        self.assertEqual([item['id'] for item in seen], [order.id for order in reversed(orders)])
+        self.assertEqual({item['item_count'] for item in seen}, {2})
+
+    def test_list_query_count_does_not_grow_with_orders(self):
+        for i in range(8):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('30.00'))
+            for _ in range(3):
+                OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal('10.00'))
+
+        # One aggregated query, with the item counts and without a COUNT(*) for pagination
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.json()['results']), 8)
+
+
+class OrderDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=10,
+            isbn='9780441013593',
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order_id = self.client.post('/api/orders/create/').json()['id']
+
+    def test_items_keep_product_details_from_purchase_time(self):
+        Product.objects.filter(pk=self.product.pk).update(title='Diuna', author='F. Herbert', price=Decimal('99.00'))
+
+        item = self.client.get(f'/api/orders/{self.order_id}/').json()['items'][0]
+        self.assertEqual(item['product_title'], 'Dune')
+        self.assertEqual(item['product_author'], 'Frank Herbert')
+        self.assertEqual(item['product_isbn'], '9780441013593')
+        self.assertEqual(item['price'], '10.00')
+
+    def test_detail_query_count_does_not_grow_with_items(self):
+        for i in range(5):
+            OrderItem.objects.create(order_id=self.order_id, product=self.product, quantity=1, price=Decimal('10.00'))
+
+        # The order and one query for all its items
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/orders/{self.order_id}/')
+        self.assertEqual(len(response.json()['items']), 6)
+
+    def test_finalized_order_is_served_from_cache(self):
+        refund_window_ago = timezone.now() - settings.ORDER_REFUND_WINDOW - timedelta(minutes=1)
+        Order.objects.filter(pk=self.order_id).update(payment_status='paid', updated_at=refund_window_ago)
+        url = f'/api/orders/{self.order_id}/'
+        first = self.client.get(url).json()
+
+        # Served from the cache without database queries
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+
+        other = CustomUser.objects.create_user(email='other@example.com', password='secret-pass-1')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_status_change_evicts_cached_order(self):
+        refund_window_ago = timezone.now() - settings.ORDER_REFUND_WINDOW - timedelta(minutes=1)
+        Order.objects.filter(pk=self.order_id).update(payment_status='paid', updated_at=refund_window_ago)
+        url = f'/api/orders/{self.order_id}/'
+        self.client.get(url)
+
+        order = Order.objects.get(pk=self.order_id)
+        order.payment_status = 'refunded'
+        order.save()
+        self.assertEqual(self.client.get(url).json()['payment_status'], 'refunded')
@@ -2,12 +2,15 @@ from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
-from django.db import transaction
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
-from .models import Order, OrderItem
-from cart.models import Cart, CartItem
-from products.models import Product
-from .serializers import OrderSerializer
+from .models import Order
+from .cache import cache_order_detail, get_cached_order_detail
+from .checkout import CheckoutError, CheckoutPipeline
+from .idempotency import get_idempotency_record, idempotent
+from cart.models import Cart
+from .pagination import OrderHistoryPagination
+from .serializers import OrderSerializer, OrderSummarySerializer
 
 
 class CreateOrderView(APIView):
@@ -16,65 +19,20 @@ class CreateOrderView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
-    @transaction.atomic
+    @idempotent
     def post(self, request):
-        # Get user's cart
-        try:
-            cart = Cart.objects.get(user=request.user)
-        except Cart.DoesNotExist:
-            return Response(
-                {'error': 'Cart is empty.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if cart has items
-        cart_items = cart.items.all()
-        if not cart_items.exists():
-            return Response(
-                {'error': 'Cart is empty.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Validate stock availability for all items
-        for cart_item in cart_items:
-            if cart_item.quantity > cart_item.product.stock:
-                return Response(
-                    {'error': f'Insufficient stock for {cart_item.product.title}. Only {cart_item.product.stock} available.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        # Calculate total amount
-        total_amount = sum(item.subtotal for item in cart_items)
+        cart = Cart.objects.filter(user=request.user).first()
         
         # Pobierz domyślny adres użytkownika (jeśli istnieje)
         user_address = request.user.addresses.filter(is_default=True).first()
-
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            user_address=user_address,
-            total_amount=total_amount,
-            payment_status='pending'
-        )
-
-        # Create order items and update product stock
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price,
-                selected_format=cart_item.selected_format
-            )
-
-            # Update product stock
-            product = cart_item.product
-            product.stock -= cart_item.quantity
-            product.save()
-
-        # Clear cart
-        cart_items.delete()
-
+        
+        # Create order, reserve stock and clear cart
+        pipeline = CheckoutPipeline(cart, entry_point='order', idempotency_record=get_idempotency_record(request))
+        try:
+            order = pipeline.run(user=request.user, user_address=user_address)
+        except CheckoutError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        
         # Return created order
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -82,21 +40,43 @@ class CreateOrderView(APIView):
 
 class OrderListView(generics.ListAPIView):
     """
-    API endpoint to list user's orders.
+    API endpoint to list user's orders as summaries, newest first.
+    Cursor-paginated; full items are available from OrderDetailView.
     """
-    serializer_class = OrderSerializer
+    serializer_class = OrderSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderHistoryPagination
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects
+            .filter(user=self.request.user)
+            .only('id', 'created_at', 'total_amount', 'payment_status')
+            .annotate(item_count=Count('items'))
+        )
 
 
 class OrderDetailView(generics.RetrieveAPIView):
     """
-    API endpoint to retrieve a single order.
+    API endpoint to retrieve a single order with its items.
     """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def retrieve(self, request, *args, **kwargs):
+        # Finalized orders are served from the cache
+        data = get_cached_order_detail(kwargs['pk'], request.user.pk)
+        if data is None:
+            order = self.get_object()
+            data = self.get_serializer(order).data
+            cache_order_detail(order, data)
+        return Response(data)
+    
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        # Order and its items in two queries, items carry their product snapshot
+        return (
+            Order.objects
+            .filter(user=self.request.user)
+            .select_related('user')
+            .prefetch_related('items')
+        )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, StripeWebhookEvent
 
 
 @admin.register(Payment)
@@ -7,7 +7,7 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ['id', 'order', 'stripe_session_id', 'amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['order__id', 'stripe_session_id', 'order__user__email']
-    readonly_fields = ['created_at', 'updated_at', 'stripe_session_id']
+    readonly_fields = ['created_at', 'updated_at', 'stripe_session_id', 'stripe_payment_intent_id']
     list_per_page = 25
     
     fieldsets = (
@@ -16,10 +16,19 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('wide',)
         }),
         ('Stripe', {
-            'fields': ('stripe_session_id',),
+            'fields': ('stripe_session_id', 'stripe_payment_intent_id'),
         }),
         ('Daty', {
             'fields': ('created_at', 'updated_at'),
         }),
     )
 
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['event_id']
+    readonly_fields = ['event_id', 'event_type', 'payload', 'attempts', 'last_error', 'received_at', 'processed_at']
+    list_per_page = 25
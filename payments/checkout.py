@@ -0,0 +1,110 @@
+"""
+Stripe checkout sessions for committed orders.
+
+The order and its stock reservation are committed before Stripe is called,
+so no database locks are held while waiting on the network. The session is
+created with an idempotency key derived from the order, so an interrupted
+checkout can be reconciled by creating the session again, which returns the
+same session.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from orders.checkout import CheckoutPipeline, release_unpaid_orders
+from .gateways import get_gateway
+from .models import Payment
+
+
+class StripeCheckoutPipeline(CheckoutPipeline):
+    """
+    Checkout paid with Stripe. A Payment without a session is created with the
+    order, marking it for reconciliation until the session is attached.
+    """
+    def create_related(self):
+        self.payment = Payment.objects.create(
+            order=self.order,
+            amount=self.total_amount,
+            status='pending'
+        )
+
+
+def get_session_idempotency_key(order):
+    return f'checkout-order-{order.id}'
+
+
+def build_session_params(order):
+    """
+    Build Stripe checkout session parameters from the order items.
+    """
+    line_items = []
+    for item in order.items.all():
+        format_str = f" - {item.get_selected_format_display()}" if item.selected_format else ""
+        line_items.append({
+            'price_data': {
+                'currency': 'pln',
+                'product_data': {
+                    'name': f"{item.product_title}{format_str}",
+                    'description': item.product_author,
+                },
+                'unit_amount': int(item.price * 100),  # Przelicz na grosze
+            },
+            'quantity': item.quantity,
+        })
+
+    return {
+        'payment_method_types': ['card'],
+        'line_items': line_items,
+        'mode': 'payment',
+        'success_url': f"{settings.FRONTEND_URL}/payment/success?session_id={{CHECKOUT_SESSION_ID}}",
+        'cancel_url': f"{settings.FRONTEND_URL}/payment/cancel",
+        # Sesja wygasa razem z nieopłaconym zamówieniem (expire_unpaid_orders)
+        'expires_at': int((order.created_at + settings.ORDER_PAYMENT_DEADLINE).timestamp()),
+        'metadata': {
+            'order_id': order.id,
+            'user_id': order.user_id,
+        },
+        # Zdarzenia payment_intent.* wskazują zamówienie przez metadane
+        'payment_intent_data': {
+            'metadata': {'order_id': order.id},
+        },
+    }
+
+
+def create_checkout_session(order):
+    """
+    Create the checkout session of an order. Must be called outside a transaction.
+    Calling it again for the same order returns the same session.
+    Raises PaymentGatewayError.
+    """
+    return get_gateway().create_checkout_session(
+        build_session_params(order),
+        idempotency_key=get_session_idempotency_key(order),
+    )
+
+
+def attach_session(payment, session):
+    """
+    Record the Stripe session of a payment created without one.
+    """
+    Payment.objects.filter(pk=payment.pk, stripe_session_id__isnull=True).update(stripe_session_id=session.id)
+
+
+@transaction.atomic
+def complete_checkout(pipeline, session):
+    """
+    Attach the Stripe session to the payment and clear the ordered cart items.
+    """
+    attach_session(pipeline.payment, session)
+    pipeline.clear_cart()
+
+
+@transaction.atomic
+def cancel_checkout(payment):
+    """
+    Fail a payment that never got a Stripe session and release its order's stock.
+    Returns True if the order was still pending and has been released.
+    """
+    if not release_unpaid_orders([payment.order_id]):
+        return False
+    Payment.objects.filter(pk=payment.pk).update(status='failed')
+    return True
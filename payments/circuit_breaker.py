@@ -0,0 +1,104 @@
+"""
+Circuit breaker for calls to the payment provider.
+
+After a number of consecutive failures the breaker opens and calls fail fast
+for a recovery period, so a provider outage does not tie up every worker
+waiting on timeouts. Then a single trial call is let through (half-open):
+success closes the breaker, failure opens it again.
+
+State is kept per process and exported as the payment_gateway_circuit_state
+gauge: 0 closed, 1 half-open, 2 open.
+"""
+import threading
+import time
+
+from backend import metrics
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """
+    Raised when a call is rejected because the breaker is open.
+    """
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.0f}s.")
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker shared by all calls to one provider.
+    """
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+        self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.set_gauge('payment_gateway_circuit_state', STATE_VALUES[state], gateway=self.name)
+
+    def retry_after(self):
+        if self.state != OPEN:
+            return 0
+        return max(0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def is_available(self):
+        """
+        Check without reserving a call if a call would currently be allowed.
+        """
+        with self.lock:
+            if self.state == OPEN:
+                available = self.retry_after() == 0
+            else:
+                available = not (self.state == HALF_OPEN and self.trial_running)
+        if not available:
+            metrics.increment('payment_gateway_circuit_rejected_total', gateway=self.name)
+        return available
+
+    def before_call(self):
+        """
+        Reserve a call. Raises CircuitOpen if calls are not allowed.
+        """
+        with self.lock:
+            if self.state == OPEN:
+                if self.retry_after() > 0:
+                    metrics.increment('payment_gateway_circuit_rejected_total', gateway=self.name)
+                    raise CircuitOpen(self.name, self.retry_after())
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.trial_running:
+                    metrics.increment('payment_gateway_circuit_rejected_total', gateway=self.name)
+                    raise CircuitOpen(self.name, self.recovery_timeout)
+                self.trial_running = True
+
+    def record_success(self):
+        """
+        Record a call the provider answered, including rejections of invalid requests.
+        """
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        """
+        Record a call that failed because the provider was unreachable or erroring.
+        """
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
@@ -0,0 +1,357 @@
+"""
+Payment gateways.
+
+Checkout and webhook views talk to a gateway instead of the stripe module.
+settings.PAYMENT_GATEWAY selects the implementation:
+
+- payments.gateways.StripeGateway - Stripe API (default)
+- payments.gateways.FakeGateway - in-process provider for load tests and CI,
+  with configurable latency and failure rate. It emits Stripe-format events
+  signed with STRIPE_WEBHOOK_SECRET, so they go through the same webhook
+  verification, storage and processing as real Stripe events.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+import requests
+import stripe
+
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class PaymentGatewayError(Exception):
+    """
+    Raised when the payment provider rejects or fails a request.
+    """
+
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    """
+    Raised when the payment provider is unreachable or its circuit breaker is open.
+    """
+    def __init__(self, message, retry_after=None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class InvalidWebhookSignature(PaymentGatewayError):
+    """
+    Raised when a webhook payload is not signed with the webhook secret.
+    """
+
+
+class CheckoutSession:
+    """
+    Checkout session created by a gateway.
+    """
+    def __init__(self, id, url):
+        self.id = id
+        self.url = url
+
+
+class PaymentGateway:
+    """
+    Interface of payment gateways.
+    """
+    def is_available(self):
+        """
+        Check if the provider can currently be called, so checkout can fail fast.
+        """
+        return True
+
+    def create_checkout_session(self, params, idempotency_key):
+        """
+        Create a checkout session from Stripe-format session parameters.
+        Calling it again with the same idempotency key returns the same session.
+        """
+        raise NotImplementedError
+
+    def list_checkout_sessions(self, created_gte):
+        """
+        Yield checkout sessions created at or after a Unix timestamp, newest first,
+        as dicts with id, status, payment_status and payment_intent. Fetched in pages.
+        """
+        raise NotImplementedError
+
+    def construct_event(self, payload, signature):
+        """
+        Verify a webhook payload and return the event.
+        Raises ValueError for malformed payloads and InvalidWebhookSignature.
+        """
+        try:
+            return stripe.Webhook.construct_event(payload, signature, settings.STRIPE_WEBHOOK_SECRET)
+        except stripe.error.SignatureVerificationError as e:
+            raise InvalidWebhookSignature(str(e)) from e
+
+
+def configure_stripe_http_client():
+    """
+    Make the Stripe SDK use a persistent connection pool with connect/read timeouts.
+    Failed requests are retried by the SDK with exponential backoff and jitter.
+    """
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+        max_retries=0,  # Ponawianiem zajmuje się SDK (max_network_retries)
+    ))
+    stripe.default_http_client = stripe.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+
+
+class StripeGateway(PaymentGateway):
+    """
+    Gateway calling the Stripe API through a pooled HTTP client and a circuit breaker.
+    """
+    # Errors meaning Stripe is unreachable or failing, as opposed to rejecting the request
+    PROVIDER_FAILURES = (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError)
+
+    def __init__(self):
+        configure_stripe_http_client()
+        self.breaker = CircuitBreaker(
+            'stripe',
+            failure_threshold=settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.STRIPE_CIRCUIT_RECOVERY_SECONDS,
+        )
+
+    def is_available(self):
+        return self.breaker.is_available()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a Stripe API method through the circuit breaker.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpen as e:
+            raise PaymentGatewayUnavailable(str(e), retry_after=e.retry_after) from e
+
+        try:
+            result = method(*args, **kwargs)
+        except self.PROVIDER_FAILURES as e:
+            self.breaker.record_failure()
+            raise PaymentGatewayUnavailable(str(e)) from e
+        except stripe.error.StripeError as e:
+            self.breaker.record_success()
+            raise PaymentGatewayError(str(e)) from e
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def create_checkout_session(self, params, idempotency_key):
+        return self.call(stripe.checkout.Session.create, **params, idempotency_key=idempotency_key)
+
+    def list_checkout_sessions(self, created_gte, page_size=100):
+        starting_after = None
+        while True:
+            params = {'created': {'gte': created_gte}, 'limit': page_size}
+            if starting_after:
+                params['starting_after'] = starting_after
+            page = self.call(stripe.checkout.Session.list, **params)
+            for session in page.data:
+                yield {
+                    'id': session.id, 'status': session.status, 'payment_status': session.payment_status,
+                    'payment_intent': session.payment_intent,
+                }
+            if not page.has_more or not page.data:
+                return
+            starting_after = page.data[-1].id
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process gateway for load testing the payment path without the network.
+
+    Settings:
+    PAYMENT_FAKE_LATENCY_MS - simulated API latency
+    PAYMENT_FAKE_FAILURE_RATE - share of session requests failing, 0.0 - 1.0
+    PAYMENT_FAKE_WEBHOOK_URL - deliver events over HTTP to this URL instead of in-process
+    """
+    def __init__(self):
+        # Events are signed like Stripe's and verified by the webhook view
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise ImproperlyConfigured('FakeGateway requires STRIPE_WEBHOOK_SECRET.')
+        self.latency = settings.PAYMENT_FAKE_LATENCY_MS / 1000
+        self.failure_rate = settings.PAYMENT_FAKE_FAILURE_RATE
+        self.webhook_url = settings.PAYMENT_FAKE_WEBHOOK_URL
+        self.sessions = {}
+        self.sessions_by_key = {}
+        self.lock = threading.Lock()
+
+    def simulate_request(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise PaymentGatewayError('Fake gateway: simulated provider failure.')
+
+    def create_checkout_session(self, params, idempotency_key):
+        self.simulate_request()
+        with self.lock:
+            session = self.sessions_by_key.get(idempotency_key)
+            if session is None:
+                session_id = f'cs_fake_{uuid.uuid4().hex}'
+                session = {
+                    'id': session_id,
+                    'object': 'checkout.session',
+                    'url': f'https://fake-payments.invalid/pay/{session_id}',
+                    'amount_total': sum(
+                        item['price_data']['unit_amount'] * item['quantity'] for item in params['line_items']
+                    ),
+                    'currency': params['line_items'][0]['price_data']['currency'] if params['line_items'] else 'pln',
+                    'metadata': {key: str(value) for key, value in params.get('metadata', {}).items()},
+                    'payment_intent': f'pi_fake_{uuid.uuid4().hex}',
+                    '_payment_intent_metadata': {
+                        key: str(value)
+                        for key, value in params.get('payment_intent_data', {}).get('metadata', {}).items()
+                    },
+                    'payment_status': 'unpaid',
+                    'status': 'open',
+                    'created': int(time.time()),
+                }
+                self.sessions[session_id] = session
+                self.sessions_by_key[idempotency_key] = session
+        return CheckoutSession(session['id'], session['url'])
+
+    def public_session(self, session):
+        # Keys starting with _ are internal to the fake
+        return {key: value for key, value in session.items() if not key.startswith('_')}
+
+    def list_checkout_sessions(self, created_gte, page_size=100):
+        with self.lock:
+            sessions = sorted(
+                (dict(session) for session in self.sessions.values() if session['created'] >= created_gte),
+                key=lambda session: session['created'],
+                reverse=True
+            )
+        for start in range(0, len(sessions), page_size):
+            self.simulate_request()
+            for session in sessions[start:start + page_size]:
+                yield {
+                    'id': session['id'], 'status': session['status'], 'payment_status': session['payment_status'],
+                    'payment_intent': session['payment_intent'],
+                }
+
+    def complete_session(self, session_id, deliver=True):
+        """
+        Simulate the customer paying: emit checkout.session.completed.
+        With deliver=False the webhook is lost, as if delivery had failed.
+        """
+        with self.lock:
+            session = self.sessions[session_id]
+            session.update(status='complete', payment_status='paid')
+        if deliver:
+            return self.emit_event('checkout.session.completed', self.public_session(session))
+
+    def expire_session(self, session_id, deliver=True):
+        """
+        Simulate an abandoned checkout: emit checkout.session.expired.
+        """
+        with self.lock:
+            session = self.sessions[session_id]
+            session.update(status='expired')
+        if deliver:
+            return self.emit_event('checkout.session.expired', self.public_session(session))
+
+    def fail_payment(self, session_id, deliver=True):
+        """
+        Simulate a declined card: emit payment_intent.payment_failed. The session stays open.
+        """
+        with self.lock:
+            session = dict(self.sessions[session_id])
+        payment_intent = {
+            'id': session['payment_intent'],
+            'object': 'payment_intent',
+            'status': 'requires_payment_method',
+            'metadata': session['_payment_intent_metadata'],
+        }
+        if deliver:
+            return self.emit_event('payment_intent.payment_failed', payment_intent)
+
+    def refund_session(self, session_id, deliver=True):
+        """
+        Simulate a full refund of a paid session: emit charge.refunded.
+        """
+        with self.lock:
+            session = dict(self.sessions[session_id])
+        charge = {
+            'id': f'ch_fake_{uuid.uuid4().hex}',
+            'object': 'charge',
+            'payment_intent': session['payment_intent'],
+            'amount': session['amount_total'],
+            'amount_refunded': session['amount_total'],
+            'refunded': True,
+        }
+        if deliver:
+            return self.emit_event('charge.refunded', charge)
+
+    def sign_payload(self, payload):
+        """
+        Sign a payload the way Stripe does, returning the Stripe-Signature header.
+        """
+        timestamp = int(time.time())
+        signature = hmac.new(
+            settings.STRIPE_WEBHOOK_SECRET.encode(),
+            f'{timestamp}.{payload}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+        return f't={timestamp},v1={signature}'
+
+    def emit_event(self, event_type, data_object):
+        """
+        Deliver a signed event to the webhook endpoint. Returns the response status code.
+        """
+        payload = json.dumps({
+            'id': f'evt_fake_{uuid.uuid4().hex}',
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': data_object},
+        })
+        signature = self.sign_payload(payload)
+
+        if self.webhook_url:
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=payload.encode(),
+                headers={'Content-Type': 'application/json', 'Stripe-Signature': signature},
+            )
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+
+        from django.test import RequestFactory
+
+        from .views import StripeWebhookView
+        request = RequestFactory().post(
+            '/api/payments/webhook/', payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+        )
+        return StripeWebhookView.as_view()(request).status_code
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """
+    Return the gateway selected by settings.PAYMENT_GATEWAY, shared by the process.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None or type(_gateway) is not import_string(settings.PAYMENT_GATEWAY):
+            _gateway = import_string(settings.PAYMENT_GATEWAY)()
+        return _gateway
@@ -0,0 +1,151 @@
+"""
+Load test of the full payment flow against the fake payment gateway:
+cart -> checkout session -> signed webhook -> webhook worker -> paid order.
+
+Run with: python manage.py load_test_payments --buyers 200 --concurrency 20 --latency-ms 150
+Add --webhook-loss-rate 0.1 to also check recovery of lost webhooks by reconcile_payments.
+
+Runs in a throwaway database (backend.benchmarks), never in the configured one.
+"""
+import random
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from backend.benchmarks import benchmark_database, percentile
+from cart.models import Cart, CartItem
+from orders.models import Order
+from payments.gateways import get_gateway
+from payments.models import Payment
+from payments.views import CreateCheckoutSessionView
+from payments.webhooks import process_batch
+from products.models import Product
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent checkouts and payments through the fake gateway and verify every order ends up consistent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--latency-ms', type=int, default=100, help='Simulated gateway latency')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of failing session requests')
+        parser.add_argument('--webhook-loss-rate', type=float, default=0.0,
+                            help='Share of lost webhooks, recovered by reconcile_payments')
+
+    def handle(self, *args, **options):
+        fake_settings = {
+            'PAYMENT_GATEWAY': 'payments.gateways.FakeGateway',
+            'PAYMENT_FAKE_LATENCY_MS': options['latency_ms'],
+            'PAYMENT_FAKE_FAILURE_RATE': options['failure_rate'],
+            'PAYMENT_FAKE_WEBHOOK_URL': '',
+            'STRIPE_WEBHOOK_SECRET': settings.STRIPE_WEBHOOK_SECRET or f'whsec_{secrets.token_hex(16)}',
+        }
+        with benchmark_database(), override_settings(**fake_settings):
+            self.run_load_test(options)
+
+    def run_load_test(self, options):
+        buyers_count = options['buyers']
+        run_id = uuid.uuid4().hex[:8]
+        gateway = get_gateway()
+
+        product = Product.objects.create(
+            title=f'Load test {run_id}',
+            author='Load test',
+            description='Produkt testowy',
+            price=10,
+            stock=buyers_count,
+        )
+        users = []
+        for i in range(buyers_count):
+            user = User.objects.create_user(email=f'load-{run_id}-{i}@example.com')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1, selected_format='paperback')
+            users.append(user)
+
+        factory = APIRequestFactory()
+        view = CreateCheckoutSessionView.as_view()
+        timings = {'checkout': [], 'webhook': []}
+        results = []
+        results_lock = threading.Lock()
+
+        def buy(user):
+            try:
+                request = factory.post('/api/payments/create-checkout-session/')
+                force_authenticate(request, user=user)
+                started = time.perf_counter()
+                response = view(request)
+                checkout_ms = (time.perf_counter() - started) * 1000
+
+                webhook_ms = None
+                if response.status_code == 200:
+                    session_id = Payment.objects.get(order__user=user).stripe_session_id
+                    started = time.perf_counter()
+                    gateway.complete_session(session_id, deliver=random.random() >= options['webhook_loss_rate'])
+                    webhook_ms = (time.perf_counter() - started) * 1000
+                result = response.status_code
+            except Exception as e:
+                result, checkout_ms, webhook_ms = repr(e), None, None
+            finally:
+                connection.close()
+            with results_lock:
+                results.append(result)
+                if checkout_ms is not None:
+                    timings['checkout'].append(checkout_ms)
+                if webhook_ms is not None:
+                    timings['webhook'].append(webhook_ms)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(buy, users))
+        flow_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        processed = 0
+        while batch := process_batch(100):
+            processed += batch
+        worker_seconds = time.perf_counter() - started
+
+        if options['webhook_loss_rate']:
+            call_command('reconcile_payments', stdout=self.stdout)
+
+        product.refresh_from_db()
+        orders = Order.objects.filter(user__in=users)
+        paid = orders.filter(payment_status='paid').count()
+        failed = orders.filter(payment_status='failed').count()
+        succeeded = sum(1 for result in results if result == 200)
+
+        self.stdout.write(f'Buyers: {buyers_count}, concurrency: {options["concurrency"]}')
+        self.stdout.write(f'Checkouts: {succeeded} ok, {failed} failed at the gateway, {flow_seconds:.2f}s '
+                          f'({buyers_count / flow_seconds:.1f} checkouts/s)')
+        for name, values in timings.items():
+            self.stdout.write(f'{name} ms: p50={percentile(values, 0.5):.1f} '
+                              f'p95={percentile(values, 0.95):.1f} p99={percentile(values, 0.99):.1f}')
+        self.stdout.write(f'Webhook events processed: {processed} in {worker_seconds:.2f}s')
+        self.stdout.write(f'Orders paid: {paid}, final stock: {product.stock}')
+        errors = [result for result in results if result not in (200, 400)]
+        if errors:
+            self.stdout.write(f'Unexpected results: {errors[:10]}')
+
+        consistent = (
+            not errors
+            and paid == succeeded
+            and paid + failed == buyers_count
+            and product.stock == buyers_count - paid
+        )
+
+        if not consistent:
+            raise CommandError('Inconsistent payment flow: paid orders, checkouts and stock do not match.')
+        self.stdout.write(self.style.SUCCESS('Payment flow consistent.'))
@@ -0,0 +1,17 @@
+"""
+Process stored Stripe webhook events.
+
+Run with: python manage.py process_webhook_events --loop
+"""
+from backend.jobs import PollingCommand
+from payments.webhooks import process_batch
+
+
+class Command(PollingCommand):
+    help = 'Apply stored Stripe webhook events in batches.'
+    batch_size = 50
+    interval = 2.0
+    summary = 'Processed {} webhook events.'
+
+    def process(self, options):
+        return process_batch(options['batch_size'])
@@ -0,0 +1,66 @@
+"""
+Finish or cancel Stripe checkouts interrupted between committing the order
+and attaching its Stripe session.
+
+Run with: python manage.py reconcile_checkout_sessions
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.checkout import attach_session, cancel_checkout, create_checkout_session
+from payments.gateways import PaymentGatewayError, PaymentGatewayUnavailable
+from payments.models import Payment
+
+# Stripe keeps idempotency keys for 24 hours; older sessions cannot be recovered
+STRIPE_IDEMPOTENCY_WINDOW = timedelta(hours=24)
+
+
+class Command(BaseCommand):
+    help = 'Attach or cancel Stripe checkout sessions of payments left without one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes', type=int, default=15,
+            help='Skip payments younger than this, their checkout may still be running.'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        payments = (
+            Payment.objects
+            .select_related('order')
+            .filter(
+                stripe_session_id__isnull=True,
+                status='pending',
+                order__payment_status='pending',
+                created_at__lte=now - timedelta(minutes=options['grace_minutes']),
+            )
+        )
+
+        attached = cancelled = 0
+        for payment in payments:
+            order = payment.order
+            if payment.created_at > now - STRIPE_IDEMPOTENCY_WINDOW:
+                try:
+                    # Same idempotency key as the checkout, so Stripe returns the original session
+                    session = create_checkout_session(order)
+                except PaymentGatewayUnavailable as e:
+                    # Provider down - try again on the next run instead of cancelling
+                    self.stderr.write(f'Order #{order.id}: {e}')
+                    continue
+                except PaymentGatewayError as e:
+                    self.stderr.write(f'Order #{order.id}: {e}')
+                else:
+                    attach_session(payment, session)
+                    attached += 1
+                    continue
+
+            # The customer never received a payment link - return the stock
+            if cancel_checkout(payment):
+                cancelled += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Attached {attached} sessions, cancelled {cancelled} orders.'
+        ))
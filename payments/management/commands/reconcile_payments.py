@@ -0,0 +1,154 @@
+"""
+Reconcile pending payments with the payment provider, for webhooks that were lost.
+
+Only sessions of the last ORDER_PAYMENT_DEADLINE + ORDER_PAYMENT_GRACE are
+listed; pending payments older than that can no longer be paid and are expired.
+
+Run with: python manage.py reconcile_payments
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from notifications.outbox import enqueue_emails
+from orders.checkout import mark_orders_paid, release_unpaid_orders
+from orders.emails import paid_order_confirmation
+from orders.models import Order
+from payments.gateways import PaymentGatewayError, get_gateway
+from payments.models import Payment
+from products.sales import record_paid_orders
+
+logger = logging.getLogger(__name__)
+
+# Sessions are created after their Payment row; allow for clock skew with the provider
+CREATED_MARGIN = timedelta(minutes=5)
+
+
+class Command(BaseCommand):
+    help = 'Apply provider session statuses to pending payments in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Sessions expire at ORDER_PAYMENT_DEADLINE, so older payments cannot be paid any more
+        window_start = timezone.now() - settings.ORDER_PAYMENT_DEADLINE - settings.ORDER_PAYMENT_GRACE
+
+        stale_total = 0
+        while True:
+            stale = dict(
+                Payment.objects
+                .filter(status='pending', stripe_session_id__isnull=False, created_at__lt=window_start)
+                .order_by('id')
+                .values_list('id', 'order_id')[:batch_size]
+            )
+            if not stale:
+                break
+            stale_total += self.apply_expired(stale)
+
+        # Failed payments are included for sessions paid after their order was released, like the webhook
+        candidates = Payment.objects.filter(
+            status__in=['pending', 'failed'], stripe_session_id__isnull=False, created_at__gte=window_start
+        )
+        oldest = candidates.aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None:
+            self.stdout.write(self.style.SUCCESS(f'No pending payments, expired {stale_total} stale payments.'))
+            return
+
+        # One paged listing of recent sessions instead of one call per payment
+        created_gte = int((oldest - CREATED_MARGIN).timestamp())
+        try:
+            sessions = {
+                session['id']: session
+                for session in get_gateway().list_checkout_sessions(created_gte)
+            }
+        except PaymentGatewayError as e:
+            raise CommandError(f'Could not list checkout sessions: {e}')
+
+        paid_total = expired_total = 0
+        last_id = 0
+        while True:
+            page = list(
+                candidates.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'stripe_session_id', 'order_id', 'status')[:batch_size]
+            )
+            if not page:
+                break
+            last_id = page[-1][0]
+
+            paid, expired = {}, {}
+            for payment_id, session_id, order_id, status in page:
+                session = sessions.get(session_id)
+                if session is None:
+                    continue
+                if session['status'] == 'complete' and session['payment_status'] in ('paid', 'no_payment_required'):
+                    paid[payment_id] = (order_id, session['payment_intent'])
+                elif session['status'] == 'expired' and status == 'pending':
+                    expired[payment_id] = order_id
+
+            paid_total += self.apply_paid(paid)
+            expired_total += self.apply_expired(expired)
+
+        expired_total += stale_total
+        logger.info('event=payments_reconciled paid=%d expired=%d', paid_total, expired_total)
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {paid_total} paid and {expired_total} expired payments.'
+        ))
+
+    @transaction.atomic
+    def apply_paid(self, paid):
+        """
+        Mark payments completed and their orders paid, queueing confirmation emails.
+        paid maps payment ids to (order id, payment intent id).
+        """
+        if not paid:
+            return 0
+        # Locks serialize with the webhook worker; rows it already handled are skipped
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=paid, status__in=['pending', 'failed'])
+            .only('id')
+        )
+        now = timezone.now()
+        for payment in payments:
+            payment.status = 'completed'
+            # Refund webhooks find the payment by its intent
+            payment.stripe_payment_intent_id = paid[payment.id][1]
+            payment.updated_at = now
+        Payment.objects.bulk_update(payments, ['status', 'stripe_payment_intent_id', 'updated_at'])
+
+        paid_order_ids = mark_orders_paid([paid[payment.id][0] for payment in payments])
+        record_paid_orders(paid_order_ids)
+        orders = Order.objects.filter(id__in=paid_order_ids).select_related('user').prefetch_related('items')
+
+        emails = []
+        for order in orders:
+            # The account may have been deleted while the payment was pending
+            if order.user is None:
+                continue
+            subject, message = paid_order_confirmation(order, order.items.all())
+            emails.append((subject, message, [order.user.email]))
+        enqueue_emails(emails)
+        return len(payments)
+
+    @transaction.atomic
+    def apply_expired(self, expired):
+        """
+        Mark payments failed and release their unpaid orders.
+        """
+        if not expired:
+            return 0
+        payment_ids = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=expired, status='pending')
+            .values_list('id', flat=True)
+        )
+        Payment.objects.filter(id__in=payment_ids).update(status='failed', updated_at=timezone.now())
+        release_unpaid_orders([expired[payment_id] for payment_id in payment_ids])
+        return len(payment_ids)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_stripewebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='stripe_payment_intent_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def reopen_declined_payments(apps, schema_editor):
+    # Payments failed by a declined attempt while their session was still open
+    Payment = apps.get_model('payments', 'Payment')
+    Payment.objects.filter(
+        status='failed', order__payment_status='pending', stripe_session_id__isnull=False
+    ).update(status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_guest_email_lower_index'),
+        ('payments', '0005_payment_stripe_payment_intent_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(reopen_declined_payments, migrations.RunPython.noop),
+    ]
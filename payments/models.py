@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from orders.models import Order
 
 
@@ -15,7 +16,9 @@ class Payment(models.Model):
     ]
     
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment')
-    stripe_session_id = models.CharField(max_length=255, unique=True)
+    # Empty until the Stripe session is created after the order is committed
+    stripe_session_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    stripe_payment_intent_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -28,3 +31,36 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"Payment for Order #{self.order.id} - {self.status}"
+
+
+class StripeWebhookEvent(models.Model):
+    """
+    Model storing a verified Stripe webhook event until the worker processes it.
+    The unique event id makes redelivered events no-ops.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Oczekujące'),
+        ('processed', 'Przetworzone'),
+        ('failed', 'Nieudane'),
+    ]
+    
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'zdarzenie webhook Stripe'
+        verbose_name_plural = 'zdarzenia webhook Stripe'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='payments_webhook_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
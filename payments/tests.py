@@ -1,3 +1,267 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from notifications.models import OutgoingEmail
+from orders.checkout import release_unpaid_orders
+from orders.models import Order, OrderItem
+from products.models import Product
+from users.models import CustomUser
+from . import webhooks
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+from .gateways import FakeGateway, PaymentGatewayError, get_gateway
+from .models import Payment, StripeWebhookEvent
+
+
+class WebhookHandlerTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=0,
+        )
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('20.00'))
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=Decimal('10.00'))
+        self.payment = Payment.objects.create(order=self.order, amount=self.order.total_amount, stripe_session_id='cs_1')
+
+    def complete_session(self):
+        webhooks.handle_checkout_session_completed({
+            'id': 'cs_1', 'payment_intent': 'pi_1', 'metadata': {'order_id': self.order.id},
+        })
+
+    def set_stock(self, stock):
+        Product.objects.filter(pk=self.product.pk).update(stock=stock)
+
+    def test_completed_session_marks_order_paid_once(self):
+        self.complete_session()
+        self.complete_session()
+
+        self.order.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_payment_for_expired_order_reserves_stock_again(self):
+        release_unpaid_orders([self.order.id])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+        with self.assertLogs('orders.checkout', 'WARNING'):
+            self.complete_session()
+
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+        self.assertEqual(self.product.stock, 0)
+
+    def test_payment_for_expired_order_without_stock_is_not_marked_paid(self):
+        release_unpaid_orders([self.order.id])
+        self.set_stock(1)
+
+        with self.assertLogs('orders.checkout', 'WARNING') as logs:
+            self.complete_session()
+
+        self.assertIn('outcome=needs_refund', logs.output[0])
+        self.order.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'failed')
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 1)
+        self.assertEqual(OutgoingEmail.objects.count(), 0)
+
+    def test_declined_attempt_keeps_payment_pending(self):
+        webhooks.handle_payment_intent_failed({'id': 'pi_declined', 'metadata': {'order_id': self.order.id}})
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertEqual(self.payment.stripe_payment_intent_id, 'pi_declined')
+
+
+@override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway', STRIPE_WEBHOOK_SECRET='whsec_test')
+class FakeGatewayFlowTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'), stock=3,
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_webhook_and_worker_mark_order_paid(self):
+        response = self.client.post('/api/payments/create-checkout-session/')
+        self.assertEqual(response.status_code, 200)
+        payment = Payment.objects.get(order__user=self.user)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 2)
+
+        self.assertEqual(get_gateway().complete_session(payment.stripe_session_id), 200)
+        self.assertEqual(webhooks.process_batch(), 1)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.order.payment_status, 'paid')
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+        self.assertEqual(StripeWebhookEvent.objects.get().status, 'processed')
+
+    @mock.patch('payments.views.create_checkout_session', side_effect=PaymentGatewayError('Card declined.'))
+    def test_session_failure_fails_payment_and_releases_stock(self, _):
+        response = self.client.post('/api/payments/create-checkout-session/')
+
+        self.assertEqual(response.status_code, 400)
+        payment = Payment.objects.get(order__user=self.user)
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.order.payment_status, 'failed')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 3)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_fake_gateway_requires_webhook_secret(self):
+        with self.assertRaises(ImproperlyConfigured):
+            FakeGateway()
+
+    def test_reconcile_recovers_lost_webhooks(self):
+        self.client.post('/api/payments/create-checkout-session/')
+        payment = Payment.objects.get(order__user=self.user)
+        get_gateway().complete_session(payment.stripe_session_id, deliver=False)
+
+        call_command('reconcile_payments', stdout=StringIO())
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.order.payment_status, 'paid')
+        self.assertEqual(OutgoingEmail.objects.filter(recipient_list=['anna@example.com']).count(), 1)
+
+        # Running again changes nothing
+        call_command('reconcile_payments', stdout=StringIO())
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_refund_of_reconciled_payment_is_applied(self):
+        self.client.post('/api/payments/create-checkout-session/')
+        payment = Payment.objects.get(order__user=self.user)
+        get_gateway().complete_session(payment.stripe_session_id, deliver=False)
+        call_command('reconcile_payments', stdout=StringIO())
+
+        get_gateway().refund_session(payment.stripe_session_id)
+        self.assertEqual(webhooks.process_batch(), 1)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertEqual(payment.order.payment_status, 'refunded')
+
+    def test_reconcile_recovers_payment_of_released_order(self):
+        self.client.post('/api/payments/create-checkout-session/')
+        payment = Payment.objects.get(order__user=self.user)
+        release_unpaid_orders([payment.order_id])
+        Payment.objects.filter(pk=payment.pk).update(status='failed')
+        get_gateway().complete_session(payment.stripe_session_id, deliver=False)
+
+        call_command('reconcile_payments', stdout=StringIO())
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.order.payment_status, 'paid')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 2)
+
+    def test_reconcile_expires_payments_past_the_deadline_without_listing(self):
+        self.client.post('/api/payments/create-checkout-session/')
+        payment = Payment.objects.get(order__user=self.user)
+        Payment.objects.filter(pk=payment.pk).update(
+            created_at=timezone.now() - settings.ORDER_PAYMENT_DEADLINE - settings.ORDER_PAYMENT_GRACE
+            - timedelta(minutes=1)
+        )
+
+        with mock.patch.object(get_gateway(), 'list_checkout_sessions') as list_checkout_sessions:
+            call_command('reconcile_payments', stdout=StringIO())
+
+        list_checkout_sessions.assert_not_called()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.order.payment_status, 'failed')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 3)
+
+
+@mock.patch('payments.circuit_breaker.time.monotonic')
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=30)
+
+    def fail(self, times=1):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self, monotonic):
+        monotonic.return_value = 100
+        self.fail()
+        self.assertTrue(self.breaker.is_available())
+        self.fail()
+
+        self.assertFalse(self.breaker.is_available())
+        with self.assertRaises(CircuitOpen) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_success_resets_failure_count(self, monotonic):
+        monotonic.return_value = 100
+        self.fail()
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.fail()
+        self.assertTrue(self.breaker.is_available())
+
+    def test_half_open_allows_a_single_trial(self, monotonic):
+        monotonic.return_value = 100
+        self.fail(2)
+
+        monotonic.return_value = 131
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_available())
+
+        monotonic.return_value = 162
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.is_available())
+        self.breaker.before_call()
+
+
+@override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway', STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = json.dumps({
+            'id': 'evt_1', 'object': 'event', 'type': 'checkout.session.completed', 'created': 0,
+            'data': {'object': {'id': 'cs_1', 'object': 'checkout.session', 'metadata': {}}},
+        })
+
+    def post(self, signature):
+        return self.client.generic(
+            'POST', '/api/payments/webhook/', self.payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_redelivered_event_is_stored_once(self):
+        signature = get_gateway().sign_payload(self.payload)
+        self.assertEqual(self.post(signature).status_code, 200)
+        self.assertEqual(self.post(signature).status_code, 200)
+
+        self.assertEqual(StripeWebhookEvent.objects.filter(event_id='evt_1').count(), 1)
+        self.assertEqual(webhooks.process_batch(), 1)
+        self.assertEqual(webhooks.process_batch(), 0)
+
+    def test_invalid_signature_is_rejected(self):
+        self.assertEqual(self.post('t=0,v1=invalid').status_code, 400)
+        self.assertFalse(StripeWebhookEvent.objects.exists())
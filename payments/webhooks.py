@@ -0,0 +1,194 @@
+"""
+Processing of stored Stripe webhook events.
+
+StripeWebhookView only verifies and stores events. The process_webhook_events
+worker applies them here. Every handler is an idempotent state transition, so
+redelivered or retried events change nothing and queue no second email.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from backend import metrics
+from backend.jobs import claim_due
+from notifications.outbox import enqueue_email
+from orders.cache import invalidate_order_detail
+from orders.checkout import mark_orders_paid, release_unpaid_orders
+from orders.emails import paid_order_confirmation
+from orders.models import Order
+from products.sales import record_paid_orders, record_refunded_orders
+from .models import Payment, StripeWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed event stays invisible to other workers
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+EVENT_HANDLERS = {}
+
+
+def handles(event_type):
+    """
+    Register a handler for a Stripe event type.
+    """
+    def decorator(handler):
+        EVENT_HANDLERS[event_type] = handler
+        return handler
+    return decorator
+
+
+def store_event(event):
+    """
+    Store a verified event for the worker. Returns False if it was not stored:
+    already received, or of a type without a handler.
+    """
+    if event['type'] not in EVENT_HANDLERS:
+        return False
+    _, created = StripeWebhookEvent.objects.get_or_create(
+        event_id=event['id'],
+        defaults={
+            'event_type': event['type'],
+            'payload': event['data']['object'].to_dict(),
+        }
+    )
+    return created
+
+
+def session_payments(session):
+    """
+    Payments of a checkout session, including one whose session is not attached yet.
+    """
+    query = Q(stripe_session_id=session['id'])
+    order_id = (session.get('metadata') or {}).get('order_id')
+    if order_id:
+        query |= Q(order_id=order_id, stripe_session_id__isnull=True)
+    return Payment.objects.filter(query)
+
+
+def get_order_id(payments):
+    return payments.values_list('order_id', flat=True).first()
+
+
+@handles('checkout.session.completed')
+def handle_checkout_session_completed(session):
+    payments = session_payments(session)
+    order_id = get_order_id(payments)
+    if order_id is None:
+        logger.warning('event=webhook_payment_not_found session_id=%s', session['id'])
+        return
+
+    payments.exclude(status__in=['completed', 'refunded']).update(
+        status='completed',
+        stripe_session_id=session['id'],
+        stripe_payment_intent_id=session.get('payment_intent'),
+        updated_at=timezone.now(),
+    )
+
+    # Tylko przejście na 'paid' kolejkuje e-mail, więc nie zostanie wysłany dwa razy
+    if not mark_orders_paid([order_id]):
+        return
+    record_paid_orders([order_id])
+
+    order = Order.objects.select_related('user').get(id=order_id)
+    # The account may have been deleted while the payment was pending
+    if order.user is None:
+        return
+    subject, message = paid_order_confirmation(order, order.items.all())
+    enqueue_email(subject, message, [order.user.email])
+
+
+@handles('checkout.session.expired')
+def handle_checkout_session_expired(session):
+    payments = session_payments(session)
+    order_id = get_order_id(payments)
+    if order_id is None:
+        return
+    payments.filter(status='pending').update(status='failed', updated_at=timezone.now())
+    # Zwolnij zarezerwowany stan magazynowy (tylko jeśli zamówienie wciąż czeka na płatność)
+    release_unpaid_orders([order_id])
+
+
+@handles('payment_intent.payment_failed')
+def handle_payment_intent_failed(payment_intent):
+    """
+    A declined payment attempt. The checkout session stays open and the customer
+    may retry with another card, so the payment stays pending (and visible to
+    reconcile_payments); only the intent is recorded. Stock is released when
+    the session expires.
+    """
+    order_id = (payment_intent.get('metadata') or {}).get('order_id')
+    if not order_id:
+        return
+    Payment.objects.filter(order_id=order_id, status='pending').update(
+        stripe_payment_intent_id=payment_intent['id'], updated_at=timezone.now()
+    )
+
+
+@handles('charge.refunded')
+def handle_charge_refunded(charge):
+    """
+    A refund. Partial refunds keep the order paid.
+    """
+    if not charge.get('refunded'):
+        return
+    payments = Payment.objects.filter(stripe_payment_intent_id=charge['payment_intent'])
+    order_id = get_order_id(payments)
+    if order_id is None:
+        logger.warning('event=webhook_payment_not_found payment_intent=%s', charge['payment_intent'])
+        return
+    payments.exclude(status='refunded').update(status='refunded', updated_at=timezone.now())
+    # Only a paid order was counted in the sales rollups
+    if Order.objects.filter(id=order_id, payment_status='paid').update(
+        payment_status='refunded', updated_at=timezone.now()
+    ):
+        record_refunded_orders([order_id])
+        invalidate_order_detail(order_id)
+    elif Order.objects.filter(id=order_id).exclude(payment_status='refunded').update(
+        payment_status='refunded', updated_at=timezone.now()
+    ):
+        invalidate_order_detail(order_id)
+
+
+def process_event(event):
+    """
+    Apply one stored event. Events without a handler are no-ops.
+    """
+    handler = EVENT_HANDLERS.get(event.event_type)
+    if handler is not None:
+        handler(event.payload)
+
+
+def process_batch(batch_size=50):
+    """
+    Process due events, skipping events claimed by other workers.
+    Returns the number of events processed.
+    """
+    events = claim_due(StripeWebhookEvent.objects.all(), CLAIM_TIMEOUT, limit=batch_size)
+    for event in events:
+        try:
+            # The event's changes and its status commit together
+            with transaction.atomic():
+                process_event(event)
+                event.status = 'processed'
+                event.processed_at = timezone.now()
+                event.last_error = ''
+                event.save(update_fields=['status', 'processed_at', 'last_error'])
+        except Exception as e:
+            event.last_error = str(e)
+            if event.attempts >= settings.STRIPE_WEBHOOK_MAX_ATTEMPTS:
+                event.status = 'failed'
+            else:
+                event.next_attempt_at = timezone.now() + timedelta(
+                    seconds=settings.STRIPE_WEBHOOK_RETRY_DELAY_SECONDS * event.attempts
+                )
+            event.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+            metrics.increment('stripe_webhook_events_total', event_type=event.event_type, outcome='error')
+            logger.exception('event=webhook_failed event_id=%s attempts=%d', event.event_id, event.attempts)
+        else:
+            metrics.increment('stripe_webhook_events_total', event_type=event.event_type, outcome='processed')
+    return len(events)
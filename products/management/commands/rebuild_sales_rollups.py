@@ -0,0 +1,31 @@
+"""
+Recompute the daily sales rollups from paid orders, one vendor company per transaction.
+
+Run after deploying the rollups, or to repair them after orders were changed
+outside the payment flow (e.g. in the admin).
+
+Run with: python manage.py rebuild_sales_rollups [--vendor-company ID]
+"""
+from django.core.management.base import BaseCommand
+
+from products.sales import rebuild_vendor_rollups
+from users.models import VendorCompany
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups used by vendor analytics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor-company', type=int, action='append', dest='vendor_companies',
+                            help='Only rebuild this vendor company (can be repeated)')
+
+    def handle(self, *args, **options):
+        vendor_company_ids = options['vendor_companies'] or list(
+            VendorCompany.objects.order_by('id').values_list('id', flat=True)
+        )
+        for vendor_company_id in vendor_company_ids:
+            rebuild_vendor_rollups(vendor_company_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt sales rollups for {len(vendor_company_ids)} vendor companies.'
+        ))
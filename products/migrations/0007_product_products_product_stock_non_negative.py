@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_remove_product_products_pr_vendor__16bf37_idx_and_more'),
+        ('users', '0006_passwordresettoken'),
+    ]
+
+    operations = [
+        # Oversold products would violate the new constraint
+        migrations.RunSQL(
+            'UPDATE products_product SET stock = 0 WHERE stock < 0',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='products_product_stock_non_negative'),
+        ),
+    ]
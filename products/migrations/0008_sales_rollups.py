@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_products_product_stock_non_negative'),
+        ('users', '0010_dataexportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('format', models.CharField(blank=True, default='', max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.product')),
+                ('vendor_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='users.vendorcompany')),
+            ],
+            options={
+                'verbose_name': 'dzienna sprzedaż produktu',
+                'verbose_name_plural': 'dzienna sprzedaż produktów',
+                'constraints': [models.UniqueConstraint(fields=('vendor_company', 'day', 'product', 'format'), name='products_sales_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendorOrdersDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vendor_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders_rollups', to='users.vendorcompany')),
+            ],
+            options={
+                'verbose_name': 'dzienna liczba zamówień dostawcy',
+                'verbose_name_plural': 'dzienne liczby zamówień dostawców',
+                'constraints': [models.UniqueConstraint(fields=('vendor_company', 'day'), name='products_orders_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_sales_rollups'),
+        ('users', '0010_dataexportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salesdailyrollup',
+            name='vendor_company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='users.vendorcompany'),
+        ),
+        migrations.AlterField(
+            model_name='vendorordersdailyrollup',
+            name='vendor_company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders_rollups', to='users.vendorcompany'),
+        ),
+    ]
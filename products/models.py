@@ -48,6 +48,9 @@ class Product(models.Model):
             models.Index(fields=['isbn']),
             models.Index(fields=['vendor_company']),
         ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='products_product_stock_non_negative'),
+        ]
     
     def __str__(self):
         return self.title
@@ -56,3 +59,58 @@ class Product(models.Model):
     def is_in_stock(self):
         """Check if product is available in stock."""
         return self.stock > 0
+
+
+class SalesDailyRollup(models.Model):
+    """
+    Model representing paid sales of a product per day (Europe/Warsaw) and format.
+    Kept up to date by products.sales when orders become paid or refunded;
+    rebuilt from orders with manage.py rebuild_sales_rollups.
+    """
+    # Indexed by the unique key below, which starts with vendor_company
+    vendor_company = models.ForeignKey(
+        VendorCompany, on_delete=models.CASCADE, related_name='sales_rollups', db_index=False
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    day = models.DateField()
+    # Empty for order items without a selected format
+    format = models.CharField(max_length=20, blank=True, default='')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'dzienna sprzedaż produktu'
+        verbose_name_plural = 'dzienna sprzedaż produktów'
+        constraints = [
+            # Leading (vendor_company, day) serves the analytics range scans
+            models.UniqueConstraint(
+                fields=['vendor_company', 'day', 'product', 'format'], name='products_sales_rollup_key'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} {self.day} {self.format or '-'}: {self.quantity}"
+
+
+class VendorOrdersDailyRollup(models.Model):
+    """
+    Model representing the number of paid orders containing a vendor's products per day.
+    Kept separately, because an order with several products counts once.
+    """
+    vendor_company = models.ForeignKey(
+        VendorCompany, on_delete=models.CASCADE, related_name='orders_rollups', db_index=False
+    )
+    day = models.DateField()
+    order_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'dzienna liczba zamówień dostawcy'
+        verbose_name_plural = 'dzienne liczby zamówień dostawców'
+        constraints = [
+            models.UniqueConstraint(fields=['vendor_company', 'day'], name='products_orders_rollup_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.vendor_company_id} {self.day}: {self.order_count}"
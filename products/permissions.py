@@ -14,7 +14,8 @@ class IsVendorOwner(permissions.BasePermission):
     Permission class to check if vendor's company owns the product.
     """
     def has_object_permission(self, request, view, obj):
+        # Porównanie identyfikatorów - bez ładowania obiektów VendorCompany
         return (
-            request.user.vendor_company and 
-            obj.vendor_company == request.user.vendor_company
+            request.user.vendor_company_id is not None and
+            obj.vendor_company_id == request.user.vendor_company_id
         )
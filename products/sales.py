@@ -0,0 +1,111 @@
+"""
+Daily sales rollups for vendor analytics.
+
+Paid sales are pre-aggregated per (vendor company, day, product, format) in
+SalesDailyRollup and paid orders per (vendor company, day) in
+VendorOrdersDailyRollup, so analytics read a few rollup rows instead of
+aggregating the vendor's whole order history.
+
+Rollups change with single INSERT ... ON CONFLICT DO UPDATE statements in
+the transaction that marks orders paid (+1) or refunds paid orders (-1).
+Rows a refund empties are deleted, so the tables match a rebuild.
+Days are calendar days in settings.TIME_ZONE of the order creation time,
+the date existing analytics reported sales under. Sales belong to the
+vendor captured on the order item, even if the product changes vendor later.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import SalesDailyRollup, VendorOrdersDailyRollup
+
+
+def _tables():
+    from django.apps import apps
+    return {
+        'rollup': SalesDailyRollup._meta.db_table,
+        'orders_rollup': VendorOrdersDailyRollup._meta.db_table,
+        'order': apps.get_model('orders', 'Order')._meta.db_table,
+        'order_item': apps.get_model('orders', 'OrderItem')._meta.db_table,
+    }
+
+
+SALES_SQL = """
+    INSERT INTO {rollup} AS r (vendor_company_id, day, product_id, format, quantity, revenue, updated_at)
+    SELECT i.vendor_company_id, (o.created_at AT TIME ZONE %(time_zone)s)::date, i.product_id,
+           COALESCE(i.selected_format, ''), %(sign)s * SUM(i.quantity), %(sign)s * SUM(i.price * i.quantity), NOW()
+    FROM {order_item} AS i
+    JOIN {order} AS o ON o.id = i.order_id
+    WHERE {condition} AND i.vendor_company_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (vendor_company_id, day, product_id, format) DO UPDATE
+    SET quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        updated_at = EXCLUDED.updated_at
+"""
+
+ORDERS_SQL = """
+    INSERT INTO {orders_rollup} AS r (vendor_company_id, day, order_count, updated_at)
+    SELECT i.vendor_company_id, (o.created_at AT TIME ZONE %(time_zone)s)::date,
+           %(sign)s * COUNT(DISTINCT o.id), NOW()
+    FROM {order_item} AS i
+    JOIN {order} AS o ON o.id = i.order_id
+    WHERE {condition} AND i.vendor_company_id IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (vendor_company_id, day) DO UPDATE
+    SET order_count = r.order_count + EXCLUDED.order_count,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Rows of the refunded orders' (vendor, day) keys left empty by a refund
+DELETE_EMPTY_SQL = """
+    WITH touched AS (
+        SELECT DISTINCT i.vendor_company_id, (o.created_at AT TIME ZONE %(time_zone)s)::date AS day
+        FROM {order_item} AS i
+        JOIN {order} AS o ON o.id = i.order_id
+        WHERE {condition} AND i.vendor_company_id IS NOT NULL
+    ), deleted_sales AS (
+        DELETE FROM {rollup} AS r USING touched AS t
+        WHERE r.vendor_company_id = t.vendor_company_id AND r.day = t.day AND r.quantity = 0
+    )
+    DELETE FROM {orders_rollup} AS r USING touched AS t
+    WHERE r.vendor_company_id = t.vendor_company_id AND r.day = t.day AND r.order_count = 0
+"""
+
+
+def _apply(condition, params):
+    tables = _tables()
+    params = {'time_zone': settings.TIME_ZONE, **params}
+    with connection.cursor() as cursor:
+        cursor.execute(SALES_SQL.format(condition=condition, **tables), params)
+        cursor.execute(ORDERS_SQL.format(condition=condition, **tables), params)
+        if params['sign'] < 0:
+            cursor.execute(DELETE_EMPTY_SQL.format(condition=condition, **tables), params)
+
+
+def record_paid_orders(order_ids):
+    """
+    Add the given orders to the rollups. Call once per order, in the transaction marking it paid.
+    """
+    if order_ids:
+        _apply('i.order_id = ANY(%(order_ids)s)', {'order_ids': list(order_ids), 'sign': 1})
+
+
+def record_refunded_orders(order_ids):
+    """
+    Remove previously paid orders from the rollups. Call once per order, in the transaction refunding it.
+    """
+    if order_ids:
+        _apply('i.order_id = ANY(%(order_ids)s)', {'order_ids': list(order_ids), 'sign': -1})
+
+
+def rebuild_vendor_rollups(vendor_company_id):
+    """
+    Recompute the rollups of one vendor company from its paid orders.
+    """
+    with transaction.atomic():
+        SalesDailyRollup.objects.filter(vendor_company_id=vendor_company_id).delete()
+        VendorOrdersDailyRollup.objects.filter(vendor_company_id=vendor_company_id).delete()
+        _apply(
+            "o.payment_status = 'paid' AND i.vendor_company_id = %(vendor_company_id)s",
+            {'vendor_company_id': vendor_company_id, 'sign': 1},
+        )
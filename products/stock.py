@@ -0,0 +1,93 @@
+"""
+Set-based stock updates.
+
+Stock is changed with single conditional UPDATE statements instead of
+read-modify-write on model instances, so concurrent checkouts can never
+sell more copies than there are in stock.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when stock could not be reserved for some of the products.
+    """
+    def __init__(self, product_ids):
+        self.product_ids = set(product_ids)
+        super().__init__(f"Insufficient stock for products: {sorted(self.product_ids)}")
+
+
+def aggregate_quantities(items):
+    """
+    Sum quantities per product for items with product_id and quantity attributes.
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item.product_id] += item.quantity
+    return dict(quantities)
+
+
+def reserve_stock(quantities):
+    """
+    Decrement stock for {product_id: quantity} in a single statement.
+
+    A product is only decremented if it has enough stock left. Either all
+    products are decremented or, if any of them is short, none of them are
+    and InsufficientStock is raised.
+    """
+    if not quantities:
+        return
+
+    product_ids = sorted(quantities)
+    values = ', '.join(['(%s, %s)'] * len(product_ids))
+    params = []
+    for product_id in product_ids:
+        params.extend([product_id, quantities[product_id]])
+
+    sql = f"""
+        UPDATE {Product._meta.db_table} AS p
+        SET stock = p.stock - v.quantity
+        FROM (VALUES {values}) AS v(id, quantity)
+        WHERE p.id = v.id AND p.stock >= v.quantity
+        RETURNING p.id
+    """
+
+    # Savepoint, so a partial decrement is rolled back when some product is short
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            reserved_ids = {row[0] for row in cursor.fetchall()}
+
+        missing_ids = set(product_ids) - reserved_ids
+        if missing_ids:
+            raise InsufficientStock(missing_ids)
+
+
+def release_stock_for_orders(order_ids):
+    """
+    Return the stock reserved by the given orders in a single statement.
+    The caller must make sure every order is released only once.
+    """
+    if not order_ids:
+        return
+
+    from django.apps import apps
+    order_item_table = apps.get_model('orders', 'OrderItem')._meta.db_table
+
+    sql = f"""
+        UPDATE {Product._meta.db_table} AS p
+        SET stock = p.stock + s.quantity
+        FROM (
+            SELECT product_id, SUM(quantity) AS quantity
+            FROM {order_item_table}
+            WHERE order_id = ANY(%s)
+            GROUP BY product_id
+        ) AS s
+        WHERE p.id = s.product_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(order_ids)])
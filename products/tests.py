@@ -1,3 +1,136 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from users.models import CustomUser, VendorCompany
+from .models import Product, SalesDailyRollup, VendorOrdersDailyRollup
+from .sales import rebuild_vendor_rollups, record_paid_orders, record_refunded_orders
+
+
+class VendorAnalyticsTests(TestCase):
+    def setUp(self):
+        self.company = VendorCompany.objects.create(name='Rebis', access_code='code')
+        self.vendor = CustomUser.objects.create_user(
+            email='vendor@example.com', password='secret-pass-1', role='vendor', vendor_company=self.company,
+        )
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'),
+            vendor_company=self.company,
+        )
+        today = timezone.localdate()
+        sales = [(today, 'paperback', 2), (today, 'ebook', 1), (today - timedelta(days=800), 'paperback', 5)]
+        for day, format, quantity in sales:
+            SalesDailyRollup.objects.create(
+                vendor_company=self.company, product=self.product, day=day, format=format,
+                quantity=quantity, revenue=Decimal('10.00') * quantity,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor)
+
+    def test_totals_without_from_cover_whole_history(self):
+        data = self.client.get('/api/vendor/analytics/').json()
+
+        self.assertIsNone(data['from'])
+        self.assertEqual(data['total_sales'], 8)
+        self.assertEqual(sum(item['quantity'] for item in data['sales_over_time']), 3)
+
+    def test_range_and_format_filters(self):
+        today = timezone.localdate()
+        data = self.client.get('/api/vendor/analytics/', {
+            'from': (today - timedelta(days=7)).isoformat(), 'granularity': 'day', 'format': 'ebook',
+        }).json()
+
+        self.assertEqual(data['from'], (today - timedelta(days=7)).isoformat())
+        self.assertEqual(data['total_sales'], 1)
+        self.assertEqual(data['sales_over_time'], [{'period': today.isoformat(), 'quantity': 1, 'revenue': 10.0}])
+
+    def test_dashboard_defaults_to_last_30_days(self):
+        today = timezone.localdate()
+        for days_ago in (29, 30):
+            SalesDailyRollup.objects.create(
+                vendor_company=self.company, product=self.product, day=today - timedelta(days=days_ago),
+                format='paperback', quantity=10, revenue=Decimal('100.00'),
+            )
+
+        period = self.client.get('/api/vendor/dashboard/').json()['period']
+
+        date_from, date_to = date.fromisoformat(period['from']), date.fromisoformat(period['to'])
+        self.assertEqual((date_to - date_from).days + 1, 30)
+        self.assertEqual(period['sales'], 13)
+
+    def test_reversed_range_is_rejected(self):
+        today = timezone.localdate()
+        response = self.client.get('/api/vendor/analytics/', {
+            'from': today.isoformat(), 'to': (today - timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.company = VendorCompany.objects.create(name='Rebis', access_code='code')
+        self.product = Product.objects.create(
+            title='Dune', author='Frank Herbert', description='', price=Decimal('10.00'),
+            vendor_company=self.company,
+        )
+
+    def create_paid_order(self, quantity, selected_format='paperback'):
+        order = Order.objects.create(total_amount=Decimal('10.00') * quantity, payment_status='paid')
+        OrderItem.objects.create(
+            order=order, product=self.product, quantity=quantity, price=Decimal('10.00'),
+            selected_format=selected_format, vendor_company=self.product.vendor_company,
+        )
+        record_paid_orders([order.id])
+        return order
+
+    def refund(self, order):
+        Order.objects.filter(pk=order.pk).update(payment_status='refunded')
+        record_refunded_orders([order.id])
+
+    def snapshot(self):
+        return (
+            sorted(SalesDailyRollup.objects.values_list('day', 'product_id', 'format', 'quantity', 'revenue')),
+            sorted(VendorOrdersDailyRollup.objects.values_list('day', 'order_count')),
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        self.create_paid_order(2)
+        self.create_paid_order(1, selected_format=None)
+        self.refund(self.create_paid_order(3))
+
+        incremental = self.snapshot()
+        rebuild_vendor_rollups(self.company.id)
+
+        self.assertEqual(self.snapshot(), incremental)
+        today = timezone.localdate()
+        self.assertEqual(incremental[0], [
+            (today, self.product.id, '', 1, Decimal('10.00')),
+            (today, self.product.id, 'paperback', 2, Decimal('20.00')),
+        ])
+        self.assertEqual(incremental[1], [(today, 2)])
+
+    def test_refund_deletes_emptied_rows(self):
+        self.refund(self.create_paid_order(2))
+
+        self.assertEqual(self.snapshot(), ([], []))
+
+    def test_refund_debits_vendor_of_the_sale(self):
+        order = self.create_paid_order(2)
+        self.create_paid_order(1, selected_format='ebook')
+        other_company = VendorCompany.objects.create(name='Znak', access_code='other')
+        self.product.vendor_company = other_company
+        self.product.save()
+
+        self.refund(order)
 
-# Create your tests here.
+        self.assertEqual(
+            list(SalesDailyRollup.objects.values_list('vendor_company_id', 'format', 'quantity')),
+            [(self.company.id, 'ebook', 1)],
+        )
+        incremental = self.snapshot()
+        rebuild_vendor_rollups(self.company.id)
+        self.assertEqual(self.snapshot(), incremental)
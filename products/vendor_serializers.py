@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Product
 
@@ -45,3 +46,39 @@ class VendorProductListSerializer(serializers.ModelSerializer):
             'stock', 'image_url', 'publication_year', 'is_in_stock', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+
+
+class VendorSalesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of vendor analytics: ?from=&to=&granularity=&format=
+    Dates are calendar days in Europe/Warsaw (settings.TIME_ZONE), both ends inclusive.
+    """
+    GRANULARITY_CHOICES = ['day', 'week', 'month']
+    # Longest range per granularity, so a response has at most a few hundred buckets
+    MAX_RANGE_DAYS = {'day': 366, 'week': 5 * 366, 'month': 20 * 366}
+    
+    to = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=GRANULARITY_CHOICES, default='month')
+    format = serializers.ChoiceField(choices=['paperback', 'ebook'], required=False)
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'from' is a Python keyword, so it cannot be declared as a class attribute
+        fields['from'] = serializers.DateField(required=False)
+        return fields
+    
+    def validate(self, attrs):
+        """
+        Default 'to' to today, ensure the range is not reversed and not too long for the granularity.
+        """
+        attrs.setdefault('to', timezone.localdate())
+        date_from, date_to = attrs.get('from'), attrs['to']
+        if date_from:
+            if date_from > date_to:
+                raise serializers.ValidationError({'from': "Data 'from' nie może być późniejsza niż 'to'."})
+            max_days = self.MAX_RANGE_DAYS[attrs['granularity']]
+            if (date_to - date_from).days > max_days:
+                raise serializers.ValidationError({
+                    'granularity': f"Zakres dla granulacji '{attrs['granularity']}' może mieć najwyżej {max_days} dni."
+                })
+        return attrs
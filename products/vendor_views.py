@@ -1,13 +1,16 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.settings import APISettings
 from rest_framework.views import APIView
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth
-from datetime import datetime, timedelta
-from .models import Product
-from orders.models import Order, OrderItem
-from .vendor_serializers import VendorProductSerializer, VendorProductListSerializer
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncMonth, TruncWeek
+from datetime import timedelta
+from .models import Product, SalesDailyRollup, VendorOrdersDailyRollup
+from .vendor_serializers import VendorProductSerializer, VendorProductListSerializer, VendorSalesQuerySerializer
 from .permissions import IsVendor, IsVendorOwner
+from users.authentication import StatelessJWTAuthentication
+from users.models import VendorCompany
 
 
 class VendorProductListView(generics.ListAPIView):
@@ -16,14 +19,15 @@ class VendorProductListView(generics.ListAPIView):
     Lista produktów należących do firmy dostawcy zalogowanego użytkownika.
     """
     serializer_class = VendorProductListSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated, IsVendor]
     
     def get_queryset(self):
         # Zwróć produkty należące do firmy vendora
-        vendor_company = self.request.user.vendor_company
-        if not vendor_company:
+        vendor_company_id = self.request.user.vendor_company_id
+        if vendor_company_id is None:
             return Product.objects.none()
-        return Product.objects.filter(vendor_company=vendor_company)
+        return Product.objects.filter(vendor_company_id=vendor_company_id)
 
 
 class VendorProductDetailView(generics.RetrieveUpdateAPIView):
@@ -33,14 +37,15 @@ class VendorProductDetailView(generics.RetrieveUpdateAPIView):
     Można edytować tylko: description, image_url, page_count, publication_year
     """
     serializer_class = VendorProductSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated, IsVendor, IsVendorOwner]
     
     def get_queryset(self):
         # Zwróć produkty należące do firmy vendora
-        vendor_company = self.request.user.vendor_company
-        if not vendor_company:
+        vendor_company_id = self.request.user.vendor_company_id
+        if vendor_company_id is None:
             return Product.objects.none()
-        return Product.objects.filter(vendor_company=vendor_company)
+        return Product.objects.filter(vendor_company_id=vendor_company_id)
     
     def patch(self, request, *args, **kwargs):
         """
@@ -72,15 +77,61 @@ class VendorProductDetailView(generics.RetrieveUpdateAPIView):
         return Response(serializer.data)
 
 
+class SalesContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation for vendor analytics, where ?format= filters by book format
+    instead of selecting a renderer.
+    """
+    settings = APISettings(user_settings={'URL_FORMAT_OVERRIDE': None})
+
+
+BUCKET_FUNCTIONS = {'week': TruncWeek, 'month': TruncMonth}
+BUCKET_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+
+def get_sales_query(request):
+    """
+    Validate the ?from=&to=&granularity=&format= parameters of vendor analytics.
+    """
+    serializer = VendorSalesQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def get_sales_series(rollups, granularity):
+    """
+    Sum rollups into day, week (starting on Monday) or month buckets.
+    Rollup days are already Europe/Warsaw dates, so buckets need no time zone conversion.
+    """
+    if granularity == 'day':
+        buckets = rollups.values(period=F('day'))
+    else:
+        buckets = rollups.annotate(period=BUCKET_FUNCTIONS[granularity]('day')).values('period')
+    buckets = buckets.annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('period')
+    return [
+        {
+            'period': item['period'].strftime(BUCKET_FORMATS[granularity]),
+            'quantity': item['quantity'],
+            'revenue': float(item['revenue'])
+        }
+        for item in buckets
+    ]
+
+
 class VendorAnalyticsView(APIView):
     """
-    GET /vendor/analytics
+    GET /vendor/analytics?from=&to=&granularity=day|week|month&format=paperback|ebook
     Statystyki sprzedaży dla produktów firmy dostawcy.
+    Czytane z dziennych agregatów sprzedaży (products.sales), nie z pozycji zamówień.
+    Bez 'from' sumy obejmują całą historię, a szereg czasowy ostatnie 12 miesięcy.
     """
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated, IsVendor]
+    content_negotiation_class = SalesContentNegotiation
     
     def get(self, request):
-        vendor_company = request.user.vendor_company
+        query = get_sales_query(request)
+        vendor_company = VendorCompany.objects.filter(id=request.user.vendor_company_id).only('id', 'name').first()
         
         if not vendor_company:
             return Response({
@@ -88,88 +139,92 @@ class VendorAnalyticsView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Pobierz produkty firmy vendora
-        vendor_products = Product.objects.filter(vendor_company=vendor_company)
+        total_products = Product.objects.filter(vendor_company=vendor_company).count()
         
-        if not vendor_products.exists():
+        if not total_products:
             return Response({
                 'message': 'Brak produktów dla tej firmy dostawcy.',
                 'total_products': 0,
                 'total_sales': 0,
                 'total_revenue': 0,
                 'products_sold': [],
+                'sales_over_time': [],
                 'monthly_sales': []
             })
         
-        # Pobierz zamówienia zawierające produkty firmy vendora
-        order_items = OrderItem.objects.filter(
-            product__vendor_company=vendor_company,
-            order__payment_status='paid'
-        ).select_related('product', 'order')
+        # Dzienna sprzedaż produktów firmy vendora - zakres po (vendor_company, day)
+        rollups = SalesDailyRollup.objects.filter(vendor_company=vendor_company, day__lte=query['to'])
+        if query.get('format'):
+            rollups = rollups.filter(format=query['format'])
+        if query.get('from'):
+            rollups = rollups.filter(day__gte=query['from'])
         
         # Statystyki ogólne
-        total_sales = order_items.aggregate(
+        total_sales = rollups.aggregate(
             total_quantity=Sum('quantity'),
-            total_revenue=Sum('price')
+            total_revenue=Sum('revenue')
         )
         
         # Statystyki per produkt
-        products_stats = order_items.values(
-            'product__id', 'product__title', 'product__author'
-        ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('price')
-        ).order_by('-quantity_sold')[:10]
-        
-        # Sprzedaż miesięczna (ostatnie 12 miesięcy)
-        twelve_months_ago = datetime.now() - timedelta(days=365)
-        monthly_sales = order_items.filter(
-            order__created_at__gte=twelve_months_ago
-        ).annotate(
-            month=TruncMonth('order__created_at')
-        ).values('month').annotate(
-            quantity=Sum('quantity'),
-            revenue=Sum('price')
-        ).order_by('month')
-        
-        # Formatuj dane miesięczne
-        monthly_data = [
-            {
-                'month': item['month'].strftime('%Y-%m'),
-                'quantity': item['quantity'],
-                'revenue': float(item['revenue'])
-            }
-            for item in monthly_sales
-        ]
-        
-        return Response({
+        products_stats = list(
+            rollups.values('product_id').annotate(
+                quantity_sold=Sum('quantity'),
+                revenue=Sum('revenue')
+            ).filter(quantity_sold__gt=0).order_by('-quantity_sold')[:10]
+        )
+        products = Product.objects.only('title', 'author').in_bulk(
+            [item['product_id'] for item in products_stats]
+        )
+        
+        # Sprzedaż w czasie (domyślnie ostatnie 12 miesięcy)
+        series_from = query.get('from') or query['to'] - timedelta(days=365)
+        sales_over_time = get_sales_series(rollups.filter(day__gte=series_from), query['granularity'])
+        
+        data = {
             'vendor_company': vendor_company.name,
-            'total_products': vendor_products.count(),
+            # None when the totals cover the whole history
+            'from': query.get('from'),
+            'to': query['to'],
+            'granularity': query['granularity'],
+            'format': query.get('format'),
+            'total_products': total_products,
             'total_sales': total_sales['total_quantity'] or 0,
             'total_revenue': float(total_sales['total_revenue'] or 0),
             'products_sold': [
                 {
-                    'product_id': item['product__id'],
-                    'title': item['product__title'],
-                    'author': item['product__author'],
+                    'product_id': item['product_id'],
+                    'title': products[item['product_id']].title,
+                    'author': products[item['product_id']].author,
                     'quantity_sold': item['quantity_sold'],
                     'revenue': float(item['revenue'])
                 }
                 for item in products_stats
             ],
-            'monthly_sales': monthly_data,
+            'sales_over_time_from': series_from,
+            'sales_over_time': sales_over_time,
             'currency': 'PLN'
-        })
+        }
+        if query['granularity'] == 'month':
+            # Dotychczasowy format dla istniejących klientów
+            data['monthly_sales'] = [
+                {'month': item['period'], 'quantity': item['quantity'], 'revenue': item['revenue']}
+                for item in sales_over_time
+            ]
+        return Response(data)
 
 
 class VendorDashboardView(APIView):
     """
-    GET /vendor/dashboard
-    Dashboard overview for vendor company.
+    GET /vendor/dashboard?from=&to=&format=paperback|ebook
+    Dashboard overview for vendor company. The period defaults to the last 30 days.
     """
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated, IsVendor]
+    content_negotiation_class = SalesContentNegotiation
     
     def get(self, request):
-        vendor_company = request.user.vendor_company
+        query = get_sales_query(request)
+        vendor_company = VendorCompany.objects.filter(id=request.user.vendor_company_id).only('id', 'name').first()
         
         if not vendor_company:
             return Response({
@@ -177,34 +232,53 @@ class VendorDashboardView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Produkty firmy vendora
-        vendor_products = Product.objects.filter(vendor_company=vendor_company)
-        total_products = vendor_products.count()
-        in_stock_products = vendor_products.filter(stock__gt=0).count()
-        out_of_stock_products = vendor_products.filter(stock=0).count()
-        
-        # Ostatnie 30 dni
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_orders = OrderItem.objects.filter(
-            product__vendor_company=vendor_company,
-            order__payment_status='paid',
-            order__created_at__gte=thirty_days_ago
-        ).select_related('order')
-        
-        recent_sales = recent_orders.aggregate(
+        products = Product.objects.filter(vendor_company=vendor_company).aggregate(
+            total=Count('id'),
+            in_stock=Count('id', filter=Q(stock__gt=0)),
+            out_of_stock=Count('id', filter=Q(stock=0))
+        )
+        
+        # Domyślnie ostatnie 30 dni (zakres obejmuje oba końce)
+        date_to = query['to']
+        date_from = query.get('from') or date_to - timedelta(days=29)
+        recent_sales = SalesDailyRollup.objects.filter(
+            vendor_company=vendor_company,
+            day__range=(date_from, date_to)
+        )
+        if query.get('format'):
+            recent_sales = recent_sales.filter(format=query['format'])
+        recent_sales = recent_sales.aggregate(
             total_quantity=Sum('quantity'),
-            total_revenue=Sum('price')
+            total_revenue=Sum('revenue')
         )
         
-        return Response({
+        # Liczba zamówień nie jest rozbita na formaty
+        orders_count = None
+        if not query.get('format'):
+            orders_count = VendorOrdersDailyRollup.objects.filter(
+                vendor_company=vendor_company,
+                day__range=(date_from, date_to)
+            ).aggregate(orders_count=Sum('order_count'))['orders_count'] or 0
+        
+        period = {
+            'from': date_from,
+            'to': date_to,
+            'format': query.get('format'),
+            'sales': recent_sales['total_quantity'] or 0,
+            'revenue': float(recent_sales['total_revenue'] or 0),
+            'orders_count': orders_count
+        }
+        
+        data = {
             'vendor_company': vendor_company.name,
             'vendor_email': request.user.email,
-            'total_products': total_products,
-            'in_stock_products': in_stock_products,
-            'out_of_stock_products': out_of_stock_products,
-            'last_30_days': {
-                'sales': recent_sales['total_quantity'] or 0,
-                'revenue': float(recent_sales['total_revenue'] or 0),
-                'orders_count': recent_orders.values('order').distinct().count()
-            },
+            'total_products': products['total'],
+            'in_stock_products': products['in_stock'],
+            'out_of_stock_products': products['out_of_stock'],
+            'period': period,
             'currency': 'PLN'
-        })
+        }
+        if 'from' not in request.query_params and 'to' not in request.query_params:
+            # Dotychczasowy klucz dla istniejących klientów
+            data['last_30_days'] = {key: period[key] for key in ('sales', 'revenue', 'orders_count')}
+        return Response(data)
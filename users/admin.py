@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, VendorCompany, Address, PasswordResetToken
+from .models import CustomUser, VendorCompany, Address, PasswordResetToken, AccountDeletionJob, DataExportJob
 
 
 @admin.register(VendorCompany)
@@ -68,3 +68,21 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
         ('Token', {'fields': ('token', 'is_used')}),
         ('Daty', {'fields': ('created_at', 'expires_at', 'used_at')}),
     )
+
+
+@admin.register(AccountDeletionJob)
+class AccountDeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user_id', 'status', 'attempts', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'user_id']
+    readonly_fields = ['id', 'user_id', 'attempts', 'last_error', 'created_at', 'completed_at']
+    ordering = ['-created_at']
+
+
+@admin.register(DataExportJob)
+class DataExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'attempts', 'created_at', 'completed_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'user__email']
+    readonly_fields = ['id', 'user', 'file', 'attempts', 'last_error', 'created_at', 'completed_at', 'expires_at']
+    ordering = ['-created_at']
@@ -0,0 +1,90 @@
+"""
+JWT authentication without a user query per request.
+
+Tokens carry role, vendor_company_id and email claims (ClaimsRefreshToken).
+StatelessJWTAuthentication builds the request user from these claims only.
+CachedJWTAuthentication loads the full user row, cached for USER_CACHE_TIMEOUT
+seconds and evicted whenever the user is saved or deleted.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+USER_CLAIMS = ('role', 'vendor_company_id', 'email')
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role, vendor company and email.
+    Access tokens created from it copy the claims.
+    """
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['vendor_company_id'] = user.vendor_company_id
+        token['email'] = user.email
+        token['is_staff'] = user.is_staff
+        return token
+
+
+class ClaimsTokenUser(TokenUser):
+    """
+    Request user backed by token claims. Compare vendor companies by id.
+    """
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+    @cached_property
+    def vendor_company_id(self):
+        return self.token.get('vendor_company_id')
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+def get_user_cache_key(user_id):
+    return f'users:auth:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(get_user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication with the user row cached for a short time.
+    USER_CACHE_TIMEOUT = 0 disables the cache.
+    """
+    def get_user(self, validated_token):
+        timeout = settings.USER_CACHE_TIMEOUT
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not timeout or user_id is None:
+            return super().get_user(validated_token)
+
+        key = get_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, timeout)
+        return user
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    """
+    Authentication without a database query, for endpoints that only need
+    the user's id, role, vendor company and email.
+    Tokens issued before the claims were added fall back to the cached user.
+    """
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM in validated_token and all(
+            claim in validated_token for claim in USER_CLAIMS
+        ):
+            return ClaimsTokenUser(validated_token)
+        return super().get_user(validated_token)
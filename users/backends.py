@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.request import Request
+
+from .hashing import HashingOverloaded, hash_password, needs_upgrade, verify_password
+
+UserModel = get_user_model()
+
+
+class OffloadedHashingBackend(ModelBackend):
+    """
+    ModelBackend verifying passwords on the hashing pool.
+    Hashes made by an older hasher or with older parameters are upgraded after a successful login.
+    Users are looked up case-insensitively through the LOWER(email) index (see get_by_natural_key).
+
+    When the hashing pool is full, API logins get HashingOverloaded (503). Other
+    callers, such as the admin login form, cannot render it, so for them the
+    login fails like a wrong password.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self.authenticate_offloaded(username, password, **kwargs)
+        except HashingOverloaded:
+            if isinstance(request, Request):
+                raise
+            return None
+
+    def authenticate_offloaded(self, username, password, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so response time does not reveal which emails exist
+            hash_password(password)
+            return None
+
+        if not verify_password(password, user.password):
+            return None
+
+        if needs_upgrade(user.password):
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,152 @@
+"""
+Asynchronous account deletion.
+
+request_account_deletion() only deactivates the account and queues a job,
+so the request returns immediately. The process_account_deletions worker
+then removes the account in bounded batches, each in its own short
+transaction: orders are kept for accounting and anonymized in place,
+carts, addresses, tokens and data exports are deleted, and the user row goes last.
+Every step only touches rows that are still left, so a job interrupted
+at any point can simply be run again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from backend import metrics
+from backend.jobs import claim_due
+from cart.models import Cart, CartItem
+from orders.cache import invalidate_order_detail
+from orders.models import GuestOrderAddress, IdempotencyKey, Order
+from .authentication import invalidate_cached_user
+from .export import delete_exports
+from .models import AccountDeletionJob, Address, CustomUser, PasswordResetToken
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed job stays invisible to other workers
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+def request_account_deletion(user):
+    """
+    Deactivate the account and queue its deletion. Returns the job.
+    Repeated requests return the job that is already queued.
+    """
+    with transaction.atomic():
+        job = AccountDeletionJob.objects.filter(user_id=user.pk, status='pending').first()
+        if job is None:
+            job = AccountDeletionJob.objects.create(user_id=user.pk)
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+    invalidate_cached_user(user.pk)
+    metrics.increment('account_deletion_requested_total')
+    return job
+
+
+def anonymize_orders(user_id, batch_size):
+    """
+    Detach one batch of orders from the user. Returns the number of orders changed.
+
+    Guest orders linked to the account (orders.linking) also lose their guest
+    contact data and address, otherwise they would become unlinked guest
+    orders again and be linked to the next account with that email.
+    """
+    order_ids = list(Order.objects.filter(user_id=user_id).values_list('id', flat=True)[:batch_size])
+    if order_ids:
+        GuestOrderAddress.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).update(
+            user=None, user_address=None, guest_email=None, guest_first_name=None, guest_last_name=None,
+            guest_phone=None, updated_at=timezone.now(),
+        )
+        for order_id in order_ids:
+            invalidate_order_detail(order_id)
+    return len(order_ids)
+
+
+def delete_batch(queryset, batch_size):
+    """
+    Delete one batch of rows matching queryset. Returns the number of rows deleted.
+    """
+    ids = list(queryset.values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    queryset.model.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def get_steps(user_id):
+    """
+    Return (name, callable) steps of a deletion. Each callable processes one
+    batch and returns how many rows it changed, 0 when the step is done.
+    """
+    return [
+        ('orders', lambda batch_size: anonymize_orders(user_id, batch_size)),
+        ('cart_items', lambda batch_size: delete_batch(CartItem.objects.filter(cart__user_id=user_id), batch_size)),
+        ('carts', lambda batch_size: delete_batch(Cart.objects.filter(user_id=user_id), batch_size)),
+        ('addresses', lambda batch_size: delete_batch(Address.objects.filter(user_id=user_id), batch_size)),
+        ('reset_tokens', lambda batch_size: delete_batch(PasswordResetToken.objects.filter(user_id=user_id), batch_size)),
+        ('outstanding_tokens', lambda batch_size: delete_batch(OutstandingToken.objects.filter(user_id=user_id), batch_size)),
+        ('data_exports', lambda batch_size: delete_exports(user_id, batch_size)),
+        ('idempotency_keys', lambda batch_size: delete_batch(IdempotencyKey.objects.filter(scope=f'user:{user_id}'), batch_size)),
+    ]
+
+
+def run_job(job, batch_size):
+    """
+    Remove all data of the job's user, one batch per transaction.
+    """
+    for step, process in get_steps(job.user_id):
+        total = 0
+        while True:
+            with transaction.atomic():
+                processed = process(batch_size)
+            if not processed:
+                break
+            total += processed
+        logger.info('event=account_deletion_step job_id=%s step=%s rows=%d', job.id, step, total)
+
+    # Nothing references the user any more, so this is a single-row delete
+    CustomUser.objects.filter(pk=job.user_id).delete()
+    invalidate_cached_user(job.user_id)
+
+
+def claim_job():
+    """
+    Claim one due job, skipping jobs locked by other workers.
+    """
+    jobs = claim_due(AccountDeletionJob.objects.all(), CLAIM_TIMEOUT)
+    return jobs[0] if jobs else None
+
+
+def process_next_job(batch_size=500):
+    """
+    Run one due deletion job. Returns False when there was no job to run.
+    """
+    job = claim_job()
+    if job is None:
+        return False
+
+    try:
+        run_job(job, batch_size)
+    except Exception as e:
+        job.last_error = str(e)
+        if job.attempts >= settings.ACCOUNT_DELETION_MAX_ATTEMPTS:
+            job.status = 'failed'
+        else:
+            job.next_attempt_at = timezone.now() + timedelta(seconds=settings.ACCOUNT_DELETION_RETRY_DELAY_SECONDS)
+        job.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+        metrics.increment('account_deletion_total', outcome='error')
+        logger.exception('event=account_deletion_failed job_id=%s attempts=%d', job.id, job.attempts)
+        return True
+
+    job.status = 'completed'
+    job.completed_at = timezone.now()
+    job.last_error = ''
+    job.save(update_fields=['status', 'completed_at', 'last_error'])
+    metrics.increment('account_deletion_total', outcome='completed')
+    logger.info('event=account_deletion_completed job_id=%s user_id=%s', job.id, job.user_id)
+    return True
@@ -0,0 +1,201 @@
+"""
+Personal data export.
+
+The export is a zip archive with one NDJSON file per table. Rows are read
+with server-side cursors (QuerySet.iterator) and the archive is produced
+chunk by chunk, so memory use does not depend on the size of the order history.
+Small exports are streamed directly in the response; exports with more than
+USER_EXPORT_SYNC_MAX_ORDERS orders are written to storage by the
+process_data_exports worker and downloaded when ready.
+"""
+import json
+import logging
+import tempfile
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from backend import metrics
+from backend.jobs import claim_due
+from orders.models import GuestOrderAddress, Order, OrderItem
+from payments.models import Payment
+from .models import Address, CustomUser, DataExportJob
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor per round trip
+CURSOR_CHUNK_SIZE = 2000
+
+# How long a claimed job stays invisible to other workers
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+USER_FIELDS = ['id', 'email', 'first_name', 'last_name', 'phone', 'role', 'date_joined', 'last_login']
+ADDRESS_FIELDS = [
+    'id', 'recipient_name', 'street', 'postal_code', 'city', 'country', 'phone', 'is_default',
+    'created_at', 'updated_at',
+]
+# Guest fields are set on guest orders linked to the account
+ORDER_FIELDS = [
+    'id', 'order_type', 'user_address_id', 'guest_email', 'guest_first_name', 'guest_last_name', 'guest_phone',
+    'total_amount', 'payment_status', 'created_at', 'updated_at',
+]
+GUEST_ORDER_ADDRESS_FIELDS = ['id', 'order_id', 'recipient_name', 'street', 'postal_code', 'city', 'country', 'phone']
+ORDER_ITEM_FIELDS = [
+    'id', 'order_id', 'product_id', 'product_title', 'product_author', 'product_isbn', 'selected_format',
+    'quantity', 'price',
+]
+PAYMENT_FIELDS = ['id', 'order_id', 'amount', 'status', 'created_at', 'updated_at']
+
+
+def get_export_files(user_id):
+    """
+    Return (file name, queryset) pairs making up the export of a user.
+    """
+    return [
+        ('profile.ndjson', CustomUser.objects.filter(pk=user_id).values(*USER_FIELDS)),
+        ('addresses.ndjson', Address.objects.filter(user_id=user_id).order_by('id').values(*ADDRESS_FIELDS)),
+        ('orders.ndjson', Order.objects.filter(user_id=user_id).order_by('id').values(*ORDER_FIELDS)),
+        ('guest_order_addresses.ndjson', GuestOrderAddress.objects.filter(order__user_id=user_id).order_by('id').values(
+            *GUEST_ORDER_ADDRESS_FIELDS
+        )),
+        ('order_items.ndjson', OrderItem.objects.filter(order__user_id=user_id).order_by('id').values(*ORDER_ITEM_FIELDS)),
+        ('payments.ndjson', Payment.objects.filter(order__user_id=user_id).order_by('id').values(*PAYMENT_FIELDS)),
+    ]
+
+
+def needs_background_export(user_id):
+    """
+    Check if the export is too large to build during the request.
+    """
+    limit = settings.USER_EXPORT_SYNC_MAX_ORDERS
+    return Order.objects.filter(user_id=user_id)[:limit + 1].count() > limit
+
+
+class _ChunkBuffer:
+    """
+    Write-only file object collecting zip output until it is taken.
+    Without seek() and tell(), zipfile writes a streamable archive.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_export_zip(user_id):
+    """
+    Yield the export archive of a user as a sequence of byte chunks.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, queryset in get_export_files(user_id):
+            with archive.open(name, mode='w', force_zip64=True) as file:
+                for row in queryset.iterator(chunk_size=CURSOR_CHUNK_SIZE):
+                    file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode() + b'\n')
+                    if len(buffer.chunks) >= 64:
+                        yield buffer.take()
+            yield buffer.take()
+    yield buffer.take()
+
+
+def get_export_filename(user_id):
+    return f'personal-data-{user_id}.zip'
+
+
+def request_data_export(user):
+    """
+    Queue a background export. Returns the job; a pending job is reused.
+    """
+    job = DataExportJob.objects.filter(user=user, status='pending').first()
+    if job is None:
+        job = DataExportJob.objects.create(user=user)
+        metrics.increment('data_export_total', mode='background')
+    return job
+
+
+def run_job(job):
+    """
+    Build the export archive of the job's user in a temporary file and save it to storage.
+    """
+    with tempfile.TemporaryFile() as archive:
+        for chunk in iter_export_zip(job.user_id):
+            archive.write(chunk)
+        archive.seek(0)
+        job.file.save(get_export_filename(job.user_id), File(archive), save=False)
+
+
+def claim_job():
+    """
+    Claim one due job, skipping jobs locked by other workers.
+    """
+    jobs = claim_due(DataExportJob.objects.all(), CLAIM_TIMEOUT)
+    return jobs[0] if jobs else None
+
+
+def process_next_job():
+    """
+    Run one due export job. Returns False when there was no job to run.
+    """
+    job = claim_job()
+    if job is None:
+        return False
+
+    try:
+        run_job(job)
+    except Exception as e:
+        job.last_error = str(e)
+        # Otherwise the job is retried once the claim times out
+        if job.attempts >= settings.USER_EXPORT_MAX_ATTEMPTS:
+            job.status = 'failed'
+        metrics.increment('data_export_jobs_total', outcome='error')
+        logger.exception('event=data_export_failed job_id=%s attempts=%d', job.id, job.attempts)
+        job.save(update_fields=['status', 'last_error'])
+        return True
+
+    job.status = 'completed'
+    job.completed_at = timezone.now()
+    job.expires_at = job.completed_at + settings.USER_EXPORT_RETENTION
+    job.last_error = ''
+    job.save(update_fields=['file', 'status', 'completed_at', 'expires_at', 'last_error'])
+    metrics.increment('data_export_jobs_total', outcome='completed')
+    logger.info('event=data_export_completed job_id=%s user_id=%s', job.id, job.user_id)
+    return True
+
+
+def purge_expired_exports():
+    """
+    Delete export files past their retention. Returns the number of exports removed.
+    """
+    jobs = list(DataExportJob.objects.filter(status='completed', expires_at__lte=timezone.now()))
+    for job in jobs:
+        if job.file:
+            job.file.delete(save=False)
+    DataExportJob.objects.filter(id__in=[job.id for job in jobs]).update(status='expired', file='')
+    return len(jobs)
+
+
+def delete_exports(user_id, batch_size):
+    """
+    Delete one batch of the user's exports with their files. Returns the number of exports deleted.
+    """
+    jobs = list(DataExportJob.objects.filter(user_id=user_id)[:batch_size])
+    for job in jobs:
+        if job.file:
+            job.file.delete(save=False)
+    DataExportJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+    return len(jobs)
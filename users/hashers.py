@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with cost parameters from settings.
+    Hashes made with other parameters are upgraded on the next login.
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    # Hashing already runs on a pool, one lane per hash avoids oversubscribing the CPU
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count from settings, used when argon2-cffi is not installed.
+    """
+    iterations = settings.PBKDF2_ITERATIONS
@@ -0,0 +1,82 @@
+"""
+Password hashing on a bounded thread pool.
+
+Hashing runs on PASSWORD_HASHING_WORKERS threads (argon2 and hashlib release
+the GIL), so a login storm uses at most that many cores. At most
+PASSWORD_HASHING_QUEUE_DEPTH further requests wait for a worker; beyond that
+requests are rejected with 503 right away, instead of piling up and starving
+other endpoints.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from backend import metrics
+
+
+class HashingOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many login attempts are being processed. Please try again shortly.'
+    default_code = 'hashing_overloaded'
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix='password-hashing',
+)
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_DEPTH)
+
+
+def run_hashing(func, *args):
+    """
+    Run a hashing function on the pool and wait for the result.
+    Raises HashingOverloaded if the pool and its queue are full.
+    """
+    if not _slots.acquire(blocking=False):
+        metrics.increment('password_hashing_rejected_total')
+        raise HashingOverloaded()
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(raw_password):
+    """
+    make_password() on the hashing pool.
+    """
+    return run_hashing(make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """
+    check_password() on the hashing pool.
+    """
+    return run_hashing(check_password, raw_password, encoded)
+
+
+def needs_upgrade(encoded):
+    """
+    Check if a hash was made with another hasher or other parameters than the current default.
+    """
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    default = get_hasher('default')
+    return hasher.algorithm != default.algorithm or default.must_update(encoded)
+
+
+def set_password(user, raw_password):
+    """
+    Set the user's password, hashing it on the pool. The caller saves the user.
+    """
+    user.password = hash_password(raw_password)
+    user._password = raw_password
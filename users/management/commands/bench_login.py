@@ -0,0 +1,116 @@
+"""
+Login throughput benchmark.
+
+Runs concurrent logins through LoginView while catalog requests run alongside,
+and reports login throughput, latency percentiles, rejected logins (503) and
+catalog latency under the login load.
+
+Run with: python manage.py bench_login --requests 200 --concurrency 32
+
+Runs in a throwaway database (backend.benchmarks) seeded with --products
+catalog products, never in the configured one.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from backend.benchmarks import benchmark_database, percentile
+from products.models import Product
+from products.views import ProductListView
+from users.hashing import set_password
+from users.views import LoginView
+
+User = get_user_model()
+
+PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput and catalog latency under a login storm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Number of logins')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent logins')
+        parser.add_argument('--catalog-concurrency', type=int, default=2,
+                            help='Concurrent catalog clients running during the benchmark')
+        parser.add_argument('--products', type=int, default=200, help='Catalog products to seed')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        Product.objects.bulk_create([
+            Product(title=f'Book {i}', author='Benchmark', description='', price=10, stock=10)
+            for i in range(options['products'])
+        ])
+        user = User(email=f'bench-{uuid.uuid4().hex[:8]}@example.com')
+        set_password(user, PASSWORD)
+        user.save()
+
+        factory = APIRequestFactory()
+        # Measures hashing throughput, so the per-email login throttle is off
+        login_view = LoginView.as_view(throttle_classes=[])
+        catalog_view = ProductListView.as_view()
+        results = []
+        catalog_timings = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def login(_):
+            request = factory.post('/api/users/login/', {'email': user.email, 'password': PASSWORD}, format='json')
+            started = time.perf_counter()
+            try:
+                status_code = login_view(request).status_code
+            finally:
+                connection.close()
+            with lock:
+                results.append((status_code, (time.perf_counter() - started) * 1000))
+
+        def browse_catalog():
+            try:
+                while not done.is_set():
+                    started = time.perf_counter()
+                    catalog_view(factory.get('/api/products/'))
+                    with lock:
+                        catalog_timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        browsers = [threading.Thread(target=browse_catalog) for _ in range(options['catalog_concurrency'])]
+        for browser in browsers:
+            browser.start()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(login, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        done.set()
+        for browser in browsers:
+            browser.join()
+
+        ok = [duration for status_code, duration in results if status_code == 200]
+        rejected = sum(1 for status_code, _ in results if status_code == 503)
+        other = [status_code for status_code, _ in results if status_code not in (200, 503)]
+
+        self.stdout.write(
+            f'Hasher: {get_hasher().algorithm}, workers: {settings.PASSWORD_HASHING_WORKERS}, '
+            f'queue depth: {settings.PASSWORD_HASHING_QUEUE_DEPTH}'
+        )
+        self.stdout.write(f'Logins: {len(ok)} ok, {rejected} rejected (503), {len(other)} other in {elapsed:.2f}s '
+                          f'- {len(ok) / elapsed:.1f} logins/s')
+        self.stdout.write(f'Login ms: p50={percentile(ok, 0.5):.0f} p95={percentile(ok, 0.95):.0f} '
+                          f'p99={percentile(ok, 0.99):.0f}')
+        self.stdout.write(f'Catalog ms during storm: p50={percentile(catalog_timings, 0.5):.1f} '
+                          f'p95={percentile(catalog_timings, 0.95):.1f} ({len(catalog_timings)} requests)')
+        if other:
+            self.stdout.write(f'Unexpected status codes: {sorted(set(other))}')
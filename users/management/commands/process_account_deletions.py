@@ -0,0 +1,17 @@
+"""
+Process queued account deletions.
+
+Run with: python manage.py process_account_deletions --loop
+"""
+from backend.jobs import PollingCommand
+from users.deletion import process_next_job
+
+
+class Command(PollingCommand):
+    help = 'Anonymize orders and delete the data of accounts queued for deletion.'
+    # Rows changed per transaction
+    batch_size = 500
+    summary = 'Processed {} account deletions.'
+
+    def process(self, options):
+        return int(process_next_job(options['batch_size']))
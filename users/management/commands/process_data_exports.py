@@ -0,0 +1,22 @@
+"""
+Build queued personal data exports and remove expired export files.
+
+Run with: python manage.py process_data_exports --loop
+"""
+from backend.jobs import PollingCommand
+from users.export import process_next_job, purge_expired_exports
+
+
+class Command(PollingCommand):
+    help = 'Build queued personal data exports and delete expired export files.'
+
+    def handle(self, *args, **options):
+        self.purged_total = 0
+        super().handle(*args, **options)
+
+    def process(self, options):
+        self.purged_total += purge_expired_exports()
+        return int(process_next_job())
+
+    def get_summary(self, processed_total):
+        return f'Built {processed_total} data exports, removed {self.purged_total} expired exports.'
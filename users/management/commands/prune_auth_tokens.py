@@ -0,0 +1,52 @@
+"""
+Delete expired JWT outstanding/blacklisted tokens and used or expired password reset tokens.
+
+Rows are deleted in batches, so each DELETE holds its locks briefly.
+Schedule it e.g. hourly.
+
+Run with: python manage.py prune_auth_tokens
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from users.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired auth tokens and used or expired password reset tokens in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches to spread the load')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Blacklist rows are deleted with their outstanding token (on_delete=CASCADE)
+        outstanding = self.prune(OutstandingToken.objects.filter(expires_at__lte=now), options)
+        reset_tokens = self.prune(
+            PasswordResetToken.objects.filter(Q(expires_at__lte=now) | Q(is_used=True)), options
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {outstanding} expired outstanding tokens and {reset_tokens} password reset tokens.'
+        ))
+
+    def prune(self, queryset, options):
+        """
+        Delete the rows matching queryset in batches and return how many were deleted.
+        """
+        model = queryset.model
+        deleted_total = 0
+        while True:
+            ids = list(queryset.order_by().values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            _, deleted = model.objects.filter(id__in=ids).delete()
+            deleted_total += deleted.get(model._meta.label, 0)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return deleted_total
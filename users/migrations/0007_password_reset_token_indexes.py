@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_passwordresettoken'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['expires_at'], name='users_reset_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['user', 'is_used'], name='users_reset_user_used_idx'),
+        ),
+        # token_blacklist is a third-party app, so its index is created here
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS token_outstanding_expires_idx '
+            'ON token_blacklist_outstandingtoken (expires_at)',
+            reverse_sql='DROP INDEX IF EXISTS token_outstanding_expires_idx',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def normalize_emails(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    duplicates = list(
+        CustomUser.objects
+        .values(email_lower=Lower('email'))
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Accounts differing only by email case must be merged before this migration: '
+            + ', '.join(duplicates)
+        )
+    CustomUser.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0007_password_reset_token_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_email_lower_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:30
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_email_lower_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField(db_index=True)),
+                ('status', models.CharField(choices=[('pending', 'Oczekujące'), ('completed', 'Zakończone'), ('failed', 'Nieudane')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'usunięcie konta',
+                'verbose_name_plural': 'usunięcia kont',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='users_deletion_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:45
+
+import users.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def expire_public_exports(apps, schema_editor):
+    # Archives written before this migration sit under MEDIA_ROOT/exports/ with guessable names
+    DataExportJob = apps.get_model('users', 'DataExportJob')
+    jobs = DataExportJob.objects.filter(file__startswith='exports/')
+    for name in jobs.values_list('file', flat=True):
+        default_storage.delete(name)
+    jobs.update(status='expired', file='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_dataexportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(expire_public_exports, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dataexportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=users.models.get_export_storage, upload_to=users.models.export_upload_to),
+        ),
+    ]
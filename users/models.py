@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 import uuid
@@ -32,6 +35,22 @@ class CustomUserManager(BaseUserManager):
     """
     Manager for custom user model with email as the unique identifier.
     """
+    @classmethod
+    def normalize_email(cls, email):
+        """
+        Emails are stored lowercase, so they are unique regardless of case.
+        """
+        return (email or '').strip().lower()
+    
+    def filter_by_email(self, email):
+        """
+        Case-insensitive email lookup served by the LOWER(email) unique index.
+        """
+        return self.alias(email_lower=Lower('email')).filter(email_lower=self.normalize_email(email))
+    
+    def get_by_natural_key(self, username):
+        return self.filter_by_email(username).get()
+    
     def create_user(self, email, password=None, **extra_fields):
         """
         Create and save a regular user with the given email and password.
@@ -90,9 +109,19 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = 'użytkownik'
         verbose_name_plural = 'użytkownicy'
+        constraints = [
+            models.UniqueConstraint(Lower('email'), name='users_email_lower_uniq'),
+        ]
     
     def __str__(self):
         return self.email
+    
+    def save(self, *args, **kwargs):
+        """
+        Normalize the email on every write.
+        """
+        self.email = CustomUserManager.normalize_email(self.email)
+        super().save(*args, **kwargs)
 
 
 class Address(models.Model):
@@ -142,6 +171,12 @@ class PasswordResetToken(models.Model):
         verbose_name = 'token resetowania hasła'
         verbose_name_plural = 'tokeny resetowania hasła'
         ordering = ['-created_at']
+        indexes = [
+            # Pruning of expired tokens (manage.py prune_auth_tokens)
+            models.Index(fields=['expires_at'], name='users_reset_expires_idx'),
+            # Invalidating unused tokens on a new reset request
+            models.Index(fields=['user', 'is_used'], name='users_reset_user_used_idx'),
+        ]
     
     def __str__(self):
         return f"Reset token for {self.user.email} - {'Used' if self.is_used else 'Active'}"
@@ -167,3 +202,85 @@ class PasswordResetToken(models.Model):
         self.is_used = True
         self.used_at = timezone.now()
         self.save()
+
+
+class AccountDeletionJob(models.Model):
+    """
+    Model representing a requested account deletion.
+    The account is deactivated when the job is created; the process_account_deletions
+    worker anonymizes orders and deletes the remaining user data in batches.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Oczekujące'),
+        ('completed', 'Zakończone'),
+        ('failed', 'Nieudane'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Plain id, the user row is deleted by the job itself
+    user_id = models.BigIntegerField(db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'usunięcie konta'
+        verbose_name_plural = 'usunięcia kont'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='users_deletion_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Deletion of user #{self.user_id} ({self.status})"
+
+
+def get_export_storage():
+    """
+    Storage for export archives, outside MEDIA_ROOT so they are never served as public media.
+    """
+    return FileSystemStorage(location=settings.USER_EXPORT_ROOT)
+
+
+def export_upload_to(instance, filename):
+    # Random name, so archive paths cannot be derived from user ids
+    return f'{uuid.uuid4().hex}.zip'
+
+
+class DataExportJob(models.Model):
+    """
+    Model representing a personal data export built in the background.
+    Exports too large to stream during the request are written to storage
+    by the process_data_exports worker and kept until expires_at.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Oczekujący'),
+        ('completed', 'Gotowy'),
+        ('failed', 'Nieudany'),
+        ('expired', 'Wygasły'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='data_exports')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to=export_upload_to, storage=get_export_storage, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'eksport danych'
+        verbose_name_plural = 'eksporty danych'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='users_export_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Data export for user #{self.user_id} ({self.status})"
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import VendorCompany, Address, PasswordResetToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import ClaimsRefreshToken
+from .hashing import set_password, verify_password
+from .models import VendorCompany, Address, PasswordResetToken, AccountDeletionJob, DataExportJob
 import re
 
 User = get_user_model()
@@ -45,7 +48,8 @@ class VendorRegistrationSerializer(serializers.Serializer):
             raise serializers.ValidationError({"company_access_code": "Nieprawidłowe hasło dostępu dla tej firmy."})
         
         # Check if email already exists
-        if User.objects.filter(email=attrs['email']).exists():
+        attrs['email'] = User.objects.normalize_email(attrs['email'])
+        if User.objects.filter_by_email(attrs['email']).exists():
             raise serializers.ValidationError({"email": "Ten adres email jest już zarejestrowany."})
         
         attrs['company'] = company
@@ -67,7 +71,7 @@ class VendorRegistrationSerializer(serializers.Serializer):
             role='vendor',
             vendor_company=company
         )
-        user.set_password(password)
+        set_password(user, password)
         user.save()
         
         return user
@@ -90,7 +94,7 @@ class UserSerializer(serializers.ModelSerializer):
         """
         password = validated_data.pop('password')
         user = User(**validated_data)
-        user.set_password(password)
+        set_password(user, password)
         user.save()
         return user
     
@@ -102,7 +106,7 @@ class UserSerializer(serializers.ModelSerializer):
         user = super().update(instance, validated_data)
         
         if password:
-            user.set_password(password)
+            set_password(user, password)
             user.save()
         
         return user
@@ -112,6 +116,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     """
     Serializer for user registration.
     """
+    email = serializers.EmailField(required=True, max_length=255)
     password = serializers.CharField(write_only=True, required=True, min_length=8, style={'input_type': 'password'})
     password_confirm = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     
@@ -119,6 +124,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         model = User
         fields = ['email', 'password', 'password_confirm']
     
+    def validate_email(self, value):
+        """
+        Normalize email and check it is not taken in any letter case.
+        """
+        value = User.objects.normalize_email(value)
+        if User.objects.filter_by_email(value).exists():
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+    
     def validate(self, attrs):
         """
         Validate that passwords match.
@@ -134,7 +148,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
         user = User(**validated_data)
-        user.set_password(password)
+        set_password(user, password)
         user.save()
         return user
 
@@ -241,7 +255,7 @@ class ForgotPasswordSerializer(serializers.Serializer):
         """
         Normalize email.
         """
-        return value.lower().strip()
+        return User.objects.normalize_email(value)
 
 
 class ResetPasswordSerializer(serializers.Serializer):
@@ -292,3 +306,45 @@ class ResetPasswordSerializer(serializers.Serializer):
         #     raise serializers.ValidationError("Hasło musi zawierać co najmniej jedną cyfrę.")
         
         return value
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Token pair serializer for /api/token/ issuing tokens with role and vendor claims.
+    """
+    token_class = ClaimsRefreshToken
+
+
+class AccountDeletionSerializer(serializers.Serializer):
+    """
+    Serializer confirming account deletion with the current password.
+    """
+    password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
+    
+    def validate_password(self, value):
+        """
+        Check the password of the user deleting the account.
+        """
+        if not verify_password(value, self.context['request'].user.password):
+            raise serializers.ValidationError("Nieprawidłowe hasło.")
+        return value
+
+
+class AccountDeletionJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the status of an account deletion.
+    """
+    class Meta:
+        model = AccountDeletionJob
+        fields = ['id', 'status', 'created_at', 'completed_at']
+        read_only_fields = fields
+
+
+class DataExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the status of a background data export.
+    """
+    class Meta:
+        model = DataExportJob
+        fields = ['id', 'status', 'created_at', 'completed_at', 'expires_at']
+        read_only_fields = fields
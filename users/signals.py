@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def evict_cached_user(sender, instance, **kwargs):
+    """
+    Evict the user cached by CachedJWTAuthentication after any change.
+    """
+    invalidate_cached_user(instance.pk)
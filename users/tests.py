@@ -1,3 +1,253 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from backend.throttling import TokenBucketThrottle
+from orders.linking import link_guest_orders
+from orders.models import GuestOrderAddress, Order
+from . import export
+from .authentication import CachedJWTAuthentication, ClaimsRefreshToken, StatelessJWTAuthentication
+from .deletion import process_next_job, request_account_deletion
+from .hashing import HashingOverloaded, run_hashing
+from .models import CustomUser, PasswordResetToken, VendorCompany
+
+
+class EmailNormalizationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email='  Anna@Example.COM ', password='secret-pass-1')
+
+    def test_email_is_stored_lowercase(self):
+        self.assertEqual(self.user.email, 'anna@example.com')
+
+    def test_case_variants_cannot_register(self):
+        response = self.client.post('/api/users/register/', {
+            'email': 'ANNA@example.com', 'password': 'secret-pass-1', 'password_confirm': 'secret-pass-1',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+
+    def test_unique_constraint_ignores_case(self):
+        # Bypasses CustomUser.save(), which would normalize the email
+        with self.assertRaises(IntegrityError):
+            CustomUser.objects.bulk_create([CustomUser(email='ANNA@example.com')])
+
+    def test_login_ignores_case(self):
+        response = self.client.post('/api/users/login/', {'email': 'ANNA@Example.com', 'password': 'secret-pass-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+
+    def test_linked_guest_orders_are_anonymized(self):
+        order = Order.objects.create(
+            order_type='guest', guest_email='anna@example.com', guest_first_name='Anna',
+            guest_last_name='Nowak', guest_phone='123456789', total_amount=Decimal('10.00'),
+        )
+        GuestOrderAddress.objects.create(
+            order=order, recipient_name='Anna Nowak', street='Długa 1', postal_code='00-001',
+            city='Warszawa', phone='123456789',
+        )
+        link_guest_orders(self.user)
+
+        request_account_deletion(self.user)
+        self.assertTrue(process_next_job())
+
+        order.refresh_from_db()
+        self.assertIsNone(order.user_id)
+        self.assertIsNone(order.guest_email)
+        self.assertIsNone(order.guest_phone)
+        self.assertFalse(GuestOrderAddress.objects.filter(order=order).exists())
+        self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+
+        # A new account with the same email does not get the order back
+        new_user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+        self.assertEqual(link_guest_orders(new_user), 0)
+
+
+class DataExportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='anna@example.com', password='secret-pass-1')
+
+    def test_background_export_is_private(self):
+        job = export.request_data_export(self.user)
+        self.assertTrue(export.process_next_job())
+        job.refresh_from_db()
+        self.addCleanup(job.file.delete, save=False)
+
+        self.assertEqual(job.status, 'completed')
+        path = Path(job.file.path)
+        self.assertFalse(path.is_relative_to(Path(settings.MEDIA_ROOT)))
+        self.assertRegex(path.name, r'^[0-9a-f]{32}\.zip$')
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/users/me/export/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+        other = CustomUser.objects.create_user(email='other@example.com', password='secret-pass-1')
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/api/users/me/export/{job.id}/').status_code, 404)
+
+    def test_linked_guest_orders_include_guest_details(self):
+        order = Order.objects.create(
+            order_type='guest', total_amount=Decimal('10.00'), guest_email='anna@example.com',
+            guest_first_name='Anna', guest_last_name='Nowak', guest_phone='500600700',
+        )
+        GuestOrderAddress.objects.create(
+            order=order, recipient_name='Anna Nowak', street='Długa 1', postal_code='00-001', city='Warszawa',
+            phone='500600700',
+        )
+        link_guest_orders(self.user)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(export.iter_export_zip(self.user.id)))) as archive:
+            [exported_order] = [json.loads(line) for line in archive.read('orders.ndjson').splitlines()]
+            [address] = [json.loads(line) for line in archive.read('guest_order_addresses.ndjson').splitlines()]
+
+        self.assertEqual(
+            [exported_order[field] for field in ['guest_email', 'guest_first_name', 'guest_last_name', 'guest_phone']],
+            ['anna@example.com', 'Anna', 'Nowak', '500600700'],
+        )
+        self.assertEqual(address['order_id'], order.id)
+        self.assertEqual((address['street'], address['city']), ('Długa 1', 'Warszawa'))
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    @mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES, {'login_email': '3/min'})
+    def test_token_endpoint_shares_login_budget(self):
+        credentials = {'email': 'Anna@example.com', 'password': 'wrong-password'}
+        self.assertEqual(self.client.post('/api/users/login/', credentials).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/', credentials).status_code, 401)
+        self.assertEqual(self.client.post('/api/users/login/', credentials).status_code, 401)
+
+        response = self.client.post('/api/token/', {**credentials, 'email': 'anna@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(USER_CACHE_TIMEOUT=60)
+class JWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = VendorCompany.objects.create(name='Rebis', access_code='code')
+        self.user = CustomUser.objects.create_user(
+            email='vendor@example.com', password='secret-pass-1', role='vendor', vendor_company=company,
+        )
+        self.token = ClaimsRefreshToken.for_user(self.user).access_token
+
+    def test_stateless_user_comes_from_claims(self):
+        with self.assertNumQueries(0):
+            user = StatelessJWTAuthentication().get_user(self.token)
+        self.assertEqual(int(user.id), self.user.id)
+        self.assertEqual(user.role, 'vendor')
+        self.assertEqual(user.vendor_company_id, self.user.vendor_company_id)
+        self.assertEqual(user.email, 'vendor@example.com')
+
+    def test_cached_user_is_evicted_on_save(self):
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.token)
+        with self.assertNumQueries(0):
+            authentication.get_user(self.token)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.get_user(self.token)
+
+
+class PruneAuthTokensTests(TestCase):
+    def test_deletes_only_expired_and_used_tokens(self):
+        user = CustomUser.objects.create_user(email='anna@example.com')
+        now = timezone.now()
+        expired = OutstandingToken.objects.create(user=user, jti='expired', token='t1', expires_at=now - timedelta(days=1))
+        BlacklistedToken.objects.create(token=expired)
+        valid = OutstandingToken.objects.create(user=user, jti='valid', token='t2', expires_at=now + timedelta(days=1))
+        PasswordResetToken.objects.create(user=user, expires_at=now - timedelta(hours=1))
+        PasswordResetToken.objects.create(user=user, expires_at=now + timedelta(hours=1), is_used=True)
+        active_reset = PasswordResetToken.objects.create(user=user, expires_at=now + timedelta(hours=1))
+
+        call_command('prune_auth_tokens', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.all()), [valid])
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertEqual(list(PasswordResetToken.objects.all()), [active_reset])
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email='anna@example.com')
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            password=make_password('secret-pass-1', hasher='pbkdf2_sha1')
+        )
+
+    def login(self):
+        return self.client.post('/api/users/login/', {'email': 'anna@example.com', 'password': 'secret-pass-1'})
+
+    def test_old_hash_is_upgraded_on_login(self):
+        self.assertEqual(self.login().status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertTrue(self.user.check_password('secret-pass-1'))
+
+    @mock.patch('users.backends.verify_password', side_effect=HashingOverloaded)
+    def test_overloaded_pool_rejects_api_login_with_503(self, _):
+        self.assertEqual(self.login().status_code, 503)
+
+    @mock.patch('users.backends.verify_password', side_effect=HashingOverloaded)
+    def test_overloaded_pool_fails_login_outside_the_api(self, _):
+        self.assertIsNone(authenticate(None, username='anna@example.com', password='secret-pass-1'))
+
+
+class HashingPoolTests(SimpleTestCase):
+    def test_requests_beyond_queue_depth_are_rejected(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        slots = threading.BoundedSemaphore(2)  # One worker and a queue of one
+        release = threading.Event()
+        with mock.patch('users.hashing._executor', executor), mock.patch('users.hashing._slots', slots):
+            waiting = [threading.Thread(target=run_hashing, args=(release.wait,)) for _ in range(2)]
+            for thread in waiting:
+                thread.start()
+            while slots._value:
+                release.wait(0.01)
+
+            with self.assertRaises(HashingOverloaded):
+                run_hashing(len, 'password')
+
+            release.set()
+            for thread in waiting:
+                thread.join()
+            self.assertEqual(run_hashing(len, 'password'), 8)
+        executor.shutdown()
@@ -11,13 +11,21 @@ from .views import (
     AddressDetailView,
     AddressSetDefaultView,
     ForgotPasswordView,
-    ResetPasswordView
+    ResetPasswordView,
+    AccountDeletionView,
+    AccountDeletionStatusView,
+    DataExportView,
+    DataExportDownloadView
 )
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('me/', MeView.as_view(), name='me'),
+    path('me/delete/', AccountDeletionView.as_view(), name='account-delete'),
+    path('me/export/', DataExportView.as_view(), name='data-export'),
+    path('me/export/<uuid:pk>/', DataExportDownloadView.as_view(), name='data-export-download'),
+    path('deletion-jobs/<uuid:pk>/', AccountDeletionStatusView.as_view(), name='account-deletion-status'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # Password reset
@@ -1,11 +1,20 @@
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import CustomUser, VendorCompany, Address, PasswordResetToken
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from backend import metrics
+from backend.throttling import EmailThrottle, IPThrottle
+from notifications.outbox import enqueue_email
+from orders.linking import link_guest_orders
+from .authentication import ClaimsRefreshToken
+from .deletion import request_account_deletion
+from .export import get_export_filename, iter_export_zip, needs_background_export, request_data_export
+from .hashing import set_password
+from .models import CustomUser, VendorCompany, Address, PasswordResetToken, AccountDeletionJob, DataExportJob
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
@@ -14,7 +23,10 @@ from .serializers import (
     UserProfileSerializer,
     AddressSerializer,
     ForgotPasswordSerializer,
-    ResetPasswordSerializer
+    ResetPasswordSerializer,
+    AccountDeletionSerializer,
+    AccountDeletionJobSerializer,
+    DataExportJobSerializer
 )
 
 
@@ -35,6 +47,8 @@ class VendorRegisterView(generics.CreateAPIView):
     """
     serializer_class = VendorRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'register'
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -42,7 +56,7 @@ class VendorRegisterView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'user': {
@@ -64,6 +78,8 @@ class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'register'
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -71,7 +87,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -80,11 +96,22 @@ class RegisterView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """
+    JWT token pair endpoint (/api/token/). It checks passwords like LoginView,
+    so it shares the login throttle buckets.
+    """
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'login'
+
+
 class LoginView(APIView):
     """
     API endpoint for user login.
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'login'
     
     def post(self, request):
         email = request.data.get('email')
@@ -105,7 +132,7 @@ class LoginView(APIView):
             )
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -125,6 +152,80 @@ class MeView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class AccountDeletionView(APIView):
+    """
+    API endpoint to delete the current user's account.
+    POST /api/users/me/delete/
+    The account is deactivated right away and deleted in the background;
+    the response carries the id of the deletion job.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = AccountDeletionSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        
+        job = request_account_deletion(request.user)
+        
+        return Response(AccountDeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class AccountDeletionStatusView(generics.RetrieveAPIView):
+    """
+    API endpoint to check the status of an account deletion.
+    GET /api/users/deletion-jobs/<uuid>/
+    The account is inactive by then, so the unguessable job id is the only credential.
+    """
+    queryset = AccountDeletionJob.objects.all()
+    serializer_class = AccountDeletionJobSerializer
+    permission_classes = [permissions.AllowAny]
+
+
+class DataExportView(APIView):
+    """
+    API endpoint to export the current user's personal data.
+    GET /api/users/me/export/
+    Returns a zip of NDJSON files streamed as it is generated. Large exports
+    are built in the background instead: the response is 202 with the job,
+    to be downloaded from /api/users/me/export/<uuid>/ when completed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        if needs_background_export(request.user.id):
+            job = request_data_export(request.user)
+            return Response(DataExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        
+        metrics.increment('data_export_total', mode='stream')
+        response = StreamingHttpResponse(iter_export_zip(request.user.id), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{get_export_filename(request.user.id)}"'
+        return response
+
+
+class DataExportDownloadView(APIView):
+    """
+    API endpoint to check or download a background data export.
+    GET /api/users/me/export/<uuid>/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        try:
+            job = DataExportJob.objects.get(pk=pk, user=request.user)
+        except DataExportJob.DoesNotExist:
+            return Response({'error': 'Export not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if job.status != 'completed':
+            return Response(DataExportJobSerializer(job).data, status=status.HTTP_200_OK)
+        
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=get_export_filename(request.user.id),
+            content_type='application/zip'
+        )
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
     API endpoint for user profile management.
@@ -202,6 +303,8 @@ class ForgotPasswordView(APIView):
     POST /api/auth/forgot-password
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'password_reset'
     
     def post(self, request):
         serializer = ForgotPasswordSerializer(data=request.data)
@@ -214,16 +317,17 @@ class ForgotPasswordView(APIView):
         success_message = "Jeśli konto z tym adresem email istnieje, wysłaliśmy link do resetowania hasła."
         
         try:
-            user = CustomUser.objects.get(email=email)
-            
-            # Invalidate all previous unused tokens for this user
-            PasswordResetToken.objects.filter(user=user, is_used=False).update(is_used=True)
-            
-            # Create new reset token
-            reset_token = PasswordResetToken.objects.create(user=user)
+            user = CustomUser.objects.get_by_natural_key(email)
             
-            # Send email with reset link
-            self.send_reset_email(user, reset_token)
+            with transaction.atomic():
+                # Invalidate all previous unused tokens for this user
+                PasswordResetToken.objects.filter(user=user, is_used=False).update(is_used=True)
+                
+                # Create new reset token
+                reset_token = PasswordResetToken.objects.create(user=user)
+                
+                # Queue email with reset link
+                self.send_reset_email(user, reset_token)
             
         except CustomUser.DoesNotExist:
             # Don't reveal that the email doesn't exist
@@ -235,7 +339,7 @@ class ForgotPasswordView(APIView):
     
     def send_reset_email(self, user, reset_token):
         """
-        Send password reset email to user.
+        Queue password reset email to user.
         """
         # Get frontend URL from settings or use default
         frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
@@ -258,17 +362,7 @@ Pozdrawiamy,
 Zespół Księgarni
 """
         
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            # Log error but don't reveal to user
-            print(f"Error sending password reset email: {e}")
+        enqueue_email(subject, message, [user.email])
 
 
 class ResetPasswordView(APIView):
@@ -277,6 +371,8 @@ class ResetPasswordView(APIView):
     POST /api/auth/reset-password
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'password_reset'
     
     def post(self, request):
         serializer = ResetPasswordSerializer(data=request.data)
@@ -286,20 +382,22 @@ class ResetPasswordView(APIView):
         token_obj = serializer.validated_data['token_obj']
         new_password = serializer.validated_data['password']
         
-        # Update user password
+        # Hash on the hashing pool before the transaction starts
         user = token_obj.user
-        user.set_password(new_password)
-        user.save()
-        
-        # Mark token as used
-        token_obj.mark_as_used()
+        set_password(user, new_password)
         
-        # Send confirmation email
-        try:
+        with transaction.atomic():
+            # Update user password
+            user.save()
+            
+            # Mark token as used
+            token_obj.mark_as_used()
+            
+            # The reset link proved the email belongs to the user
+            link_guest_orders(user)
+            
+            # Queue confirmation email
             self.send_confirmation_email(user)
-        except Exception as e:
-            # Log error but don't fail the reset
-            print(f"Error sending confirmation email: {e}")
         
         return Response({
             'message': 'Hasło zostało pomyślnie zmienione. Możesz się teraz zalogować.'
@@ -307,7 +405,7 @@ class ResetPasswordView(APIView):
     
     def send_confirmation_email(self, user):
         """
-        Send password change confirmation email.
+        Queue password change confirmation email.
         """
         subject = 'Hasło zostało zmienione'
         message = f"""
@@ -321,10 +419,4 @@ Pozdrawiamy,
 Zespół Księgarni
 """
         
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [user.email])